@@ -1,8 +1,79 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
 import flet as ft
+import httpx
 import requests
 
+from forecast_cache import ForecastCache
+
 AREA_URL = "https://www.jma.go.jp/bosai/common/const/area.json"
 FORECAST_URL = "https://www.jma.go.jp/bosai/forecast/data/forecast/{code}.json"
+AREA_TTL = 24 * 60 * 60
+PREFETCH_WORKERS = 4
+
+# shared by every page of the process; refetches only after JMA's next release
+forecasts = ForecastCache()
+
+_area = {"data": None, "at": 0.0}
+_area_lock = threading.Lock()
+_area_stats: Counter = Counter()
+
+
+def load_area() -> dict:
+    """area.json, downloaded once a day for all sessions instead of once per session."""
+    loads = _area_stats["loads"]
+    with _area_lock:  # sessions starting together wait for one download
+        if _area["data"] is None or time.monotonic() - _area["at"] >= AREA_TTL:
+            _area["data"] = requests.get(AREA_URL, timeout=10).json()
+            _area["at"] = time.monotonic()
+            _area_stats["loads"] += 1
+        elif _area_stats["loads"] != loads:
+            _area_stats["coalesced"] += 1  # waited for another session's download
+        else:
+            _area_stats["hits"] += 1
+        return _area["data"]
+
+
+def area_summary() -> str:
+    s = _area_stats
+    return f"area: {s['hits']} hits, {s['loads']} loads, {s['coalesced']} coalesced"
+
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def http() -> httpx.AsyncClient:
+    """One pooled client for the event loop all sessions' handlers run on."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=10)
+    return _client
+
+
+async def download_forecast(code: str):
+    r = await http().get(FORECAST_URL.format(code=code))
+    r.raise_for_status()
+    return r.json()
+
+
+_prefetch_slots: Optional[asyncio.Semaphore] = None
+
+
+async def warm_forecast(code: str):
+    """Fill the cache for an office the user is likely to click next."""
+    global _prefetch_slots
+    if _prefetch_slots is None:
+        # created on first use, inside the running loop; shared by all sessions
+        _prefetch_slots = asyncio.Semaphore(PREFETCH_WORKERS)
+    async with _prefetch_slots:
+        try:
+            await forecasts.get_async(code, download_forecast)
+        except Exception:
+            pass  # a click on the office shows the error
 
 
 def icons_from_weather(weather: str) -> list[str]:
@@ -24,7 +95,7 @@ def main(page: ft.Page):
     page.padding = 0
     page.bgcolor = "#BFE9FF"
 
-    area = requests.get(AREA_URL).json()
+    area = load_area()
     centers = area.get("centers", {})
     offices = area.get("offices", {})
 
@@ -66,6 +137,7 @@ def main(page: ft.Page):
     sub_text = ft.Text("", size=14)
 
     cards = ft.Column(spacing=12)
+    cache_text = ft.Text("", size=11, color=ft.Colors.GREY)
 
     right_panel = ft.Container(
         expand=True,
@@ -83,20 +155,51 @@ def main(page: ft.Page):
                 ),
                 ft.Container(height=10),
                 cards,
+                cache_text,
             ],
             expand=True,
         ),
     )
 
-    def show_forecast(code: str, name: str):
+    # prefetch tasks of the selected region; picking another region cancels them
+    prefetching: list[asyncio.Task] = []
+    # the show_forecast task of the newest selection; older ones are cancelled
+    latest = {"task": None}
+
+    def cancel_prefetch():
+        for t in prefetching:
+            t.cancel()
+        prefetching.clear()
+
+    async def on_disconnect(e):
+        cancel_prefetch()
+        if latest["task"]:
+            latest["task"].cancel()
+
+    page.on_disconnect = on_disconnect
+
+    def cache_summary(code: str) -> str:
+        counts = ", ".join(f"{n} {k}" for k, n in forecasts.key_summary(code).items())
+        return f"{forecasts.summary()} / {code}: {counts} / {area_summary()}"
+
+    async def show_forecast(code: str, name: str):
+        task, prev = asyncio.current_task(), latest["task"]
+        latest["task"] = task
+        if prev and prev is not task and not prev.done():
+            prev.cancel()
+        title_text.value = f"{name}（{code}）"
+        sub_text.value = "取得中…"
+        page.update()
+
         try:
-            data = requests.get(FORECAST_URL.format(code=code)).json()
+            data = await forecasts.get_async(code, download_forecast)
             weathers = data[0]["timeSeries"][0]["areas"][0]["weathers"]
         except Exception:
             big_icons.controls = [ft.Text("❓", size=44)]
             title_text.value = f"{name}（{code}）"
             sub_text.value = "取得失敗（ネットワーク/データ形式）"
             cards.controls = []
+            cache_text.value = cache_summary(code)
             page.update()
             return
 
@@ -130,9 +233,10 @@ def main(page: ft.Page):
                 )
             )
 
+        cache_text.value = cache_summary(code)
         page.update()
 
-    def build_prefecture_list(center_code: str):
+    async def build_prefecture_list(center_code: str):
         prefecture_list.controls = []
 
         center_info = centers.get(center_code, {})
@@ -155,7 +259,7 @@ def main(page: ft.Page):
                 ft.ListTile(
                     title=ft.Text(name),
                     subtitle=ft.Text(code),
-                    on_click=lambda e, c=code, n=name: show_forecast(c, n),
+                    on_click=lambda e, c=code, n=name: page.run_task(show_forecast, c, n),
                 )
             )
 
@@ -164,13 +268,15 @@ def main(page: ft.Page):
 
         page.update()
 
+        cancel_prefetch()
+        prefetching.extend(asyncio.create_task(warm_forecast(code)) for _, code in items[1:])
         if items:
-            show_forecast(items[0][1], items[0][0])
+            await show_forecast(items[0][1], items[0][0])
 
     center_items = sorted(centers.items(), key=lambda x: x[1].get("name", x[0]))
 
     def select_center(center_code: str):
-        build_prefecture_list(center_code)
+        page.run_task(build_prefecture_list, center_code)
 
     for ccode, info in center_items:
         cname = info.get("name", ccode)
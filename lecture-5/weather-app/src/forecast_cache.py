@@ -0,0 +1,135 @@
+"""Forecast cache that expires when JMA can have published something new.
+
+forecast/{code}.json only changes at the scheduled releases (05, 11 and
+17 JST), so an entry is fresh until the first release after its
+reportDatetime (plus a small grace for the upload). Until then repeated
+clicks cost no request at all. Entries live in an in-memory LRU, so a
+restart starts empty (this app keeps no database).
+One cache serves the whole process. Every session's handlers run on the
+same event loop, so a refetch of an office that is already in flight
+just awaits that request instead of sending another one.
+
+The release schedule helpers match lecture-6/weather/src/forecast_cache.py
+on purpose: every lecture directory is run on its own with `flet run`, so
+none of them imports from another.
+"""
+import asyncio
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+JST = timezone(timedelta(hours=9))
+PUBLISH_HOURS = (5, 11, 17)
+GRACE_SEC = 10 * 60       # the new file appears a few minutes after the hour
+RECHECK_SEC = 5 * 60      # release is late: ask again after this
+FALLBACK_TTL = 30 * 60    # payload without a usable reportDatetime
+MAX_ENTRIES = 128         # more than the ~60 offices in area.json
+
+
+def report_datetime(payload) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(payload[0]["reportDatetime"])
+    except (LookupError, TypeError, ValueError):
+        return None
+
+
+def next_publication(report: datetime) -> datetime:
+    r = report.astimezone(JST)
+    for day in range(2):
+        d = r.date() + timedelta(days=day)
+        for h in PUBLISH_HOURS:
+            t = datetime(d.year, d.month, d.day, h, tzinfo=JST)
+            if t > r:
+                return t
+    raise AssertionError("unreachable")
+
+
+def expires_at(payload, now: float) -> float:
+    report = report_datetime(payload)
+    if report is None:
+        return now + FALLBACK_TTL
+    return next_publication(report).timestamp() + GRACE_SEC
+
+
+class ForecastCache:
+    """All methods must be called on the event loop."""
+
+    def __init__(self, maxsize: int = MAX_ENTRIES):
+        self.maxsize = maxsize
+        self.entries: OrderedDict[str, tuple[Optional[str], float, object]] = OrderedDict()
+        self.inflight: dict[str, asyncio.Task] = {}
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "late": 0, "stale": 0,
+                      "requests": 0, "coalesced": 0}
+        self.key_stats: dict[str, Counter] = {}
+
+    def _count(self, key: str, code: str):
+        self.stats[key] += 1
+        self.key_stats.setdefault(code, Counter())[key] += 1
+
+    def lookup(self, code: str):
+        """(payload, fresh) for code: fresh=False means it is due for a refetch."""
+        entry = self.entries.get(code)
+        if entry is None:
+            self._count("misses", code)
+            return None, False
+        self.entries.move_to_end(code)
+        if time.time() >= entry[1]:
+            self._count("expired", code)
+            return entry[2], False
+        self._count("hits", code)
+        return entry[2], True
+
+    def store(self, code: str, payload):
+        now = time.time()
+        report = report_datetime(payload)
+        expires = expires_at(payload, now)
+        if expires <= now:
+            # the next release should be out but is not yet: ask again soon
+            self._count("late", code)
+            expires = now + RECHECK_SEC
+        self.entries[code] = (report.isoformat() if report else None, expires, payload)
+        self.entries.move_to_end(code)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    async def _refetch(self, code: str, stale, fetch: Callable[[str], Awaitable[object]]):
+        try:
+            new = await fetch(code)
+        except Exception:
+            if stale is None:
+                raise
+            self._count("stale", code)
+            return stale
+        self.store(code, new)
+        return new
+
+    async def get_async(self, code: str, fetch: Callable[[str], Awaitable[object]]):
+        """Cached payload for code, awaiting fetch(code) only when it may have changed.
+
+        If the refetch fails, an expired entry is returned rather than nothing.
+        A cancelled caller stops waiting; the request still fills the cache.
+        """
+        payload, fresh = self.lookup(code)
+        if fresh:
+            return payload
+        task = self.inflight.get(code)
+        if task is None:
+            task = self.inflight[code] = asyncio.ensure_future(self._refetch(code, payload, fetch))
+            task.add_done_callback(lambda t: self.inflight.pop(code, None))
+            self._count("requests", code)
+        else:
+            self._count("coalesced", code)
+        return await asyncio.shield(task)
+
+    def key_summary(self, code: str) -> dict:
+        """Counters of one office: hits/misses/expired/... plus requests/coalesced."""
+        return dict(self.key_stats.get(code, {}))
+
+    def summary(self) -> str:
+        s = self.stats
+        total = s["hits"] + s["misses"] + s["expired"]
+        rate = s["hits"] / total if total else 0.0
+        return (f"forecast cache: {s['hits']} hits, {s['misses']} misses, "
+                f"{s['expired']} expired ({s['late']} refetched before the release was out, {s['stale']} served stale), "
+                f"hit rate {rate:.0%}; {s['requests']} requests, {s['coalesced']} coalesced")
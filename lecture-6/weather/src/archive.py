@@ -0,0 +1,199 @@
+"""Compressed archive of full forecast/{code}.json responses.
+
+fetch_forecast only keeps the weathers; the archive keeps everything else
+(temperatures, precipitation chances, sub-areas, the weekly forecast) for
+every report JMA published, so new views need no refetch. Each series of
+a response is compressed on its own (zstd when the zstandard package is
+installed, zlib otherwise), keyed by office, reportDatetime and part. A
+view reads and decodes only the parts it asks for; decoded parts are kept
+in an LRU, and since a report never changes they never go stale.
+
+    python archive.py                     # sizes
+    python archive.py 130000 temps        # newest report's series for Tokyo
+"""
+import argparse
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from db import get_db
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+TABLE = "forecast_archive"
+REPORTS = "forecast_archive_reports"
+CACHE_SIZE = 256
+
+# names views use for the parts of a forecast/{code}.json response
+SERIES = {
+    "weather": "0/timeSeries/0",    # weathers, winds, waves (3 days)
+    "pops": "0/timeSeries/1",       # precipitation chance per 6 h
+    "temps": "0/timeSeries/2",      # min/max temperature per city
+    "week": "1/timeSeries/0",       # weekly weather codes, pops, reliabilities
+    "week_temps": "1/timeSeries/1",
+    "temp_average": "1/tempAverage",
+    "precip_average": "1/precipAverage",
+}
+
+
+def compress(data: bytes) -> tuple[str, bytes]:
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=19).compress(data)
+    return "zlib", zlib.compress(data, 9)
+
+
+def decompress(codec: str, blob: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(blob)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("this archive row is zstd-compressed: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    raise ValueError(f"unknown codec {codec!r}")
+
+
+def split(payload: list) -> tuple[list, dict[str, object]]:
+    """(meta, parts): scalar fields of each forecast, and every list/dict field as its own part."""
+    meta, parts = [], {}
+    for i, forecast in enumerate(payload):
+        keys, scalars = list(forecast), {}
+        for k, v in forecast.items():
+            if k == "timeSeries":
+                for j, ts in enumerate(v):
+                    parts[f"{i}/timeSeries/{j}"] = ts
+            elif isinstance(v, (list, dict)):
+                parts[f"{i}/{k}"] = v
+            else:
+                scalars[k] = v
+        meta.append({"keys": keys, "scalars": scalars, "series": len(forecast.get("timeSeries", []))})
+    return meta, parts
+
+
+class ForecastArchive:
+    def __init__(self, db_path: str, cache_size: int = CACHE_SIZE):
+        self.db = get_db(db_path)
+        self.cache_size = cache_size
+        self.decoded: OrderedDict[tuple[str, str, str], object] = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "decoded": 0}
+        with self.db.write() as c:
+            c.execute(f"""CREATE TABLE IF NOT EXISTS {REPORTS}(
+              office_code TEXT, report_datetime TEXT, fetched_at TEXT, meta TEXT, raw_size INTEGER,
+              PRIMARY KEY(office_code, report_datetime))""")
+            c.execute(f"""CREATE TABLE IF NOT EXISTS {TABLE}(
+              office_code TEXT, report_datetime TEXT, part TEXT, codec TEXT, data BLOB,
+              PRIMARY KEY(office_code, report_datetime, part))""")
+
+    def add(self, office_code: str, payload: list) -> bool:
+        """Archive a response unless its report is already there. True if it was new."""
+        try:
+            report = payload[0]["reportDatetime"]
+        except (LookupError, TypeError):
+            return False
+        exists = self.db.read().execute(
+            f"SELECT 1 FROM {REPORTS} WHERE office_code=? AND report_datetime=?", (office_code, report)).fetchone()
+        if exists:
+            return False
+        meta, parts = split(payload)
+        raw_size = len(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+        rows = [(office_code, report, part, *compress(json.dumps(v, ensure_ascii=False).encode("utf-8")))
+                for part, v in parts.items()]
+        with self.db.write() as c:
+            cur = c.execute(f"INSERT OR IGNORE INTO {REPORTS} VALUES(?,?,?,?,?)",
+                            (office_code, report, datetime.now().isoformat(timespec="seconds"),
+                             json.dumps(meta, ensure_ascii=False), raw_size))
+            if cur.rowcount == 0:
+                return False  # another thread archived it meanwhile
+            c.executemany(f"INSERT OR IGNORE INTO {TABLE} VALUES(?,?,?,?,?)", rows)
+        return True
+
+    def reports(self, office_code: str) -> list[str]:
+        """reportDatetimes archived for an office, newest first."""
+        rows = self.db.read().execute(
+            f"SELECT report_datetime FROM {REPORTS} WHERE office_code=? ORDER BY report_datetime DESC",
+            (office_code,)).fetchall()
+        return [r["report_datetime"] for r in rows]
+
+    def part(self, office_code: str, report: str, part: str):
+        key = (office_code, report, part)
+        with self.lock:
+            if key in self.decoded:
+                self.decoded.move_to_end(key)
+                self.stats["hits"] += 1
+                return self.decoded[key]
+        row = self.db.read().execute(
+            f"SELECT codec, data FROM {TABLE} WHERE office_code=? AND report_datetime=? AND part=?", key).fetchone()
+        if row is None:
+            raise KeyError(key)
+        value = json.loads(decompress(row["codec"], row["data"]))
+        with self.lock:
+            self.stats["decoded"] += 1
+            self.decoded[key] = value
+            while len(self.decoded) > self.cache_size:
+                self.decoded.popitem(last=False)
+        return value
+
+    def series(self, office_code: str, name: str, report: Optional[str] = None):
+        """A named series (see SERIES) of one report, the newest when report is None."""
+        if report is None:
+            reports = self.reports(office_code)
+            if not reports:
+                raise KeyError(office_code)
+            report = reports[0]
+        return self.part(office_code, report, SERIES.get(name, name))
+
+    def payload(self, office_code: str, report: str) -> list:
+        """The full response as JMA sent it (every part decoded)."""
+        row = self.db.read().execute(
+            f"SELECT meta FROM {REPORTS} WHERE office_code=? AND report_datetime=?", (office_code, report)).fetchone()
+        if row is None:
+            raise KeyError((office_code, report))
+        out = []
+        for i, m in enumerate(json.loads(row["meta"])):
+            forecast = {}
+            for k in m["keys"]:
+                if k == "timeSeries":
+                    forecast[k] = [self.part(office_code, report, f"{i}/timeSeries/{j}") for j in range(m["series"])]
+                elif k in m["scalars"]:
+                    forecast[k] = m["scalars"][k]
+                else:
+                    forecast[k] = self.part(office_code, report, f"{i}/{k}")
+            out.append(forecast)
+        return out
+
+    def summary(self) -> str:
+        c = self.db.read()
+        reports, raw = c.execute(f"SELECT COUNT(*), COALESCE(SUM(raw_size), 0) FROM {REPORTS}").fetchone()
+        stored = c.execute(f"SELECT COALESCE(SUM(LENGTH(data)), 0) FROM {TABLE}").fetchone()[0]
+        with self.lock:
+            s = dict(self.stats)
+        ratio = raw / stored if stored else 0.0
+        return (f"archive: {reports} reports, {raw / 1024:.0f} KB JSON stored as {stored / 1024:.0f} KB "
+                f"(x{ratio:.1f}); decoded parts: {s['decoded']} decoded, {s['hits']} from LRU")
+
+
+def main():
+    import main as app
+
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("office", nargs="?")
+    p.add_argument("series", nargs="?", default="temps", help=", ".join(SERIES))
+    p.add_argument("--report", default=None, help="reportDatetime (default: newest)")
+    p.add_argument("--db", default=app.DB)
+    args = p.parse_args()
+
+    archive = ForecastArchive(args.db)
+    if args.office:
+        print("reports:", ", ".join(archive.reports(args.office)[:10]))
+        print(json.dumps(archive.series(args.office, args.series, args.report), ensure_ascii=False, indent=1))
+    print(archive.summary())
+
+
+if __name__ == "__main__":
+    main()
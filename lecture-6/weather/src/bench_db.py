@@ -0,0 +1,126 @@
+"""DB time of one prefecture click, per-call connections vs db.Database.
+
+A click is what show_latest does against SQLite: save_snapshot, then
+load_snapshot for today, then saved_dates for the dropdown. Both variants
+run on a throwaway copy of the schema with some history in it.
+
+    python bench_db.py --clicks 500 --sessions 8
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import db
+import main
+
+OFFICES = [f"{i:02d}0000" for i in range(1, 48)]
+DATES = ["2025-01-01", "2025-01-02", "2025-01-03"]
+WEATHERS = ["晴れ", "くもり時々雨", "雪"]
+
+
+# the helpers as they were before db.py: a fresh connection for every call
+def legacy_con():
+    c = sqlite3.connect(main.DB)
+    c.row_factory = sqlite3.Row
+    return c
+
+
+def legacy_click(code: str):
+    sd = date.today().isoformat()
+    sa = datetime.now().isoformat(timespec="seconds")
+    c = legacy_con(); cur = c.cursor()
+    for i in range(3):
+        cur.execute(
+            """INSERT INTO snapshots
+            (office_code,office_name,saved_date,saved_at,idx,forecast_date,weather)
+            VALUES(?,?,?,?,?,?,?)""",
+            (code, "県", sd, sa, i, DATES[i], WEATHERS[i]),
+        )
+    c.commit(); c.close()
+    c = legacy_con()
+    c.execute("SELECT office_name,saved_at,forecast_date,idx,weather FROM snapshots "
+              "WHERE office_code=? AND saved_date=? ORDER BY idx", (code, sd)).fetchall()
+    c.close()
+    c = legacy_con()
+    c.execute("SELECT DISTINCT saved_date FROM snapshots WHERE office_code=? ORDER BY saved_date DESC",
+              (code,)).fetchall()
+    c.close()
+
+
+def click(code: str):
+    main.save_snapshot(code, "県", DATES, WEATHERS)
+    main.load_snapshot(code, date.today().isoformat())
+    main.saved_dates(code)
+
+
+def seed(path: str, days: int, wal: bool):
+    main.DB = path
+    main.db_init()
+    today = date.today()
+    rows = [(code, "県", (today - timedelta(days=d)).isoformat(), "2025-01-01T05:00:00", i, DATES[i], WEATHERS[i])
+            for code in OFFICES for d in range(1, days + 1) for i in range(3)]
+    with db.get_db(main.DB).write() as c:
+        c.executemany("""INSERT INTO snapshots
+            (office_code,office_name,saved_date,saved_at,idx,forecast_date,weather)
+            VALUES(?,?,?,?,?,?,?)""", rows)
+    if not wal:
+        # the old schema: no WAL, no unique key on snapshots
+        db.close_all()
+        c = sqlite3.connect(path)
+        c.execute("PRAGMA journal_mode=DELETE")
+        c.execute("DROP INDEX idx_snap_key")
+        c.execute("CREATE INDEX idx_snap ON snapshots(office_code, saved_date)")
+        c.close()
+
+
+def run(fn, clicks: int, sessions: int) -> list[float]:
+    times: list[float] = []
+    lock = threading.Lock()
+
+    def session(n: int):
+        mine = []
+        for k in range(clicks // sessions):
+            t = time.perf_counter()
+            fn(OFFICES[(n * 7 + k) % len(OFFICES)])
+            mine.append(time.perf_counter() - t)
+        with lock:
+            times.extend(mine)
+
+    threads = [threading.Thread(target=session, args=(n,)) for n in range(sessions)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    return times
+
+
+def report(label: str, times: list[float]):
+    ms = sorted(t * 1000 for t in times)
+    p95 = ms[int(len(ms) * 0.95) - 1] if len(ms) > 1 else ms[0]
+    print(f"  {label:<22} mean {statistics.mean(ms):6.2f} ms  p50 {ms[len(ms) // 2]:6.2f} ms  p95 {p95:6.2f} ms")
+
+
+def main_cli():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--clicks", type=int, default=500)
+    p.add_argument("--sessions", type=int, default=8, help="threads clicking at once, like --web sessions")
+    p.add_argument("--days", type=int, default=90, help="days of history per office before the run")
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for sessions in (1, args.sessions):
+            print(f"{args.clicks} clicks, {sessions} session(s), {args.days} days of history:")
+            seed(os.path.join(tmp, f"before-{sessions}.db"), args.days, wal=False)
+            report("connect per call", run(legacy_click, args.clicks, sessions))
+            seed(os.path.join(tmp, f"after-{sessions}.db"), args.days, wal=True)
+            report("db.Database (WAL)", run(click, args.clicks, sessions))
+            db.close_all()
+
+
+if __name__ == "__main__":
+    main_cli()
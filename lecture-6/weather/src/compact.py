@@ -0,0 +1,40 @@
+"""One-off cleanup of a weather_min.db written before snapshots had a unique key.
+
+Removes repeated snapshot rows (keeping the newest per office, day and
+slot), adds the unique key save_snapshot upserts on, and VACUUMs the file.
+Safe to run again. The app's db_init() also removes duplicates when it
+meets an old database, but only this command gives the space back.
+
+    python compact.py [path/to/weather_min.db]
+"""
+import os
+import sys
+
+import main
+from db import get_db
+
+
+def size_kb(path: str) -> float:
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p)) / 1024
+
+
+def compact(path: str):
+    if not os.path.exists(path):
+        print(f"{path}: no such database")
+        return
+    main.DB = path
+    d = get_db(path)
+    if not d.read().execute("SELECT 1 FROM sqlite_master WHERE name='snapshots'").fetchone():
+        print(f"{path}: no snapshots table, nothing to do")
+        return
+    before_kb = size_kb(path)
+    before = d.read().execute("SELECT COUNT(*) n FROM snapshots").fetchone()["n"]
+    removed = main.compact_snapshots()
+    d.vacuum()
+    d.writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    print(f"{path}: {before} snapshot rows, {removed} duplicates removed, {before - removed} kept")
+    print(f"  size {before_kb:.0f} KB -> {size_kb(path):.0f} KB")
+
+
+if __name__ == "__main__":
+    compact(sys.argv[1] if len(sys.argv) > 1 else main.DB)
@@ -0,0 +1,84 @@
+"""Long-lived SQLite connections for the weather app.
+
+Every session of `flet run --web` runs in the same process and uses the same
+weather_min.db, so connections are shared per file: one writer behind a lock
+and one read-only connection per thread. With WAL, readers never wait for
+the writer and the writer never waits for readers.
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",  # safe with WAL; fsync at checkpoints only
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",    # 8 MB page cache per connection
+    "PRAGMA mmap_size=67108864",
+)
+BUSY_TIMEOUT = 5.0
+
+
+class Database:
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.readers: list[sqlite3.Connection] = []
+        self.writer = self._connect()
+        self.writer.execute("PRAGMA journal_mode=WAL")
+
+    def _connect(self) -> sqlite3.Connection:
+        c = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        c.row_factory = sqlite3.Row
+        for p in PRAGMAS:
+            c.execute(p)
+        return c
+
+    @contextmanager
+    def write(self):
+        """The writer connection inside one transaction (commit, or rollback on error)."""
+        with self.lock, self.writer:
+            yield self.writer
+
+    def read(self) -> sqlite3.Connection:
+        """This thread's read-only connection; every SELECT sees the last commit."""
+        c = getattr(self.local, "conn", None)
+        if c is None:
+            c = self._connect()
+            c.execute("PRAGMA query_only=ON")
+            self.local.conn = c
+            with self.lock:
+                self.readers.append(c)
+        return c
+
+    def vacuum(self):
+        """Rewrite the file without free pages (cannot run inside a transaction)."""
+        with self.lock:
+            self.writer.execute("VACUUM")
+
+    def close(self):
+        with self.lock:
+            for c in self.readers:
+                c.close()
+            self.readers = []
+            self.writer.close()
+        self.local = threading.local()
+
+
+_databases: dict[str, Database] = {}
+_databases_lock = threading.Lock()
+
+
+def get_db(path: str) -> Database:
+    """The process-wide Database for path, opened on first use."""
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = Database(path)
+        return _databases[path]
+
+
+def close_all():
+    with _databases_lock:
+        for d in _databases.values():
+            d.close()
+        _databases.clear()
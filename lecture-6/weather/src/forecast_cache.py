@@ -0,0 +1,201 @@
+"""Forecast cache that expires when JMA can have published something new.
+
+forecast/{code}.json only changes at the scheduled releases (05, 11 and
+17 JST), so an entry is fresh until the first release after its
+reportDatetime (plus a small grace for the upload). Until then repeated
+clicks cost no request at all. Entries live in an in-memory LRU and, when a
+database path is given, in a forecast_cache table that survives restarts.
+That table only points at the report (office, reportDatetime, expiry); the
+payload itself is read back from the forecast archive, which already keeps
+every response compressed.
+One cache serves the whole process: concurrent refetches of an office,
+from any session, are collapsed into one request (SingleFlight).
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from single_flight import SingleFlight
+
+JST = timezone(timedelta(hours=9))
+PUBLISH_HOURS = (5, 11, 17)
+GRACE_SEC = 10 * 60       # the new file appears a few minutes after the hour
+RECHECK_SEC = 5 * 60      # release is late: ask again after this
+FALLBACK_TTL = 30 * 60    # payload without a usable reportDatetime
+MAX_ENTRIES = 128         # more than the ~60 offices in area.json
+
+TABLE = "forecast_cache"
+
+
+def report_datetime(payload) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(payload[0]["reportDatetime"])
+    except (LookupError, TypeError, ValueError):
+        return None
+
+
+def next_publication(report: datetime) -> datetime:
+    r = report.astimezone(JST)
+    for day in range(2):
+        d = r.date() + timedelta(days=day)
+        for h in PUBLISH_HOURS:
+            t = datetime(d.year, d.month, d.day, h, tzinfo=JST)
+            if t > r:
+                return t
+    raise AssertionError("unreachable")
+
+
+def expires_at(payload, now: float) -> float:
+    report = report_datetime(payload)
+    if report is None:
+        return now + FALLBACK_TTL
+    return next_publication(report).timestamp() + GRACE_SEC
+
+
+class ForecastCache:
+    def __init__(self, db_path: Optional[str] = None, maxsize: int = MAX_ENTRIES, archive=None):
+        self.db_path = db_path
+        self.maxsize = maxsize
+        self.entries: OrderedDict[str, tuple[Optional[str], float, object]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "db_hits": 0, "misses": 0, "expired": 0, "late": 0, "stale": 0}
+        self.key_stats: dict[str, Counter] = {}
+        self.flight = SingleFlight()
+        if db_path:
+            from archive import ForecastArchive
+            from db import get_db
+            self.db = get_db(db_path)
+            self.archive = archive or ForecastArchive(db_path)
+            with self.db.write() as c:
+                if "payload" in [r["name"] for r in c.execute(f"PRAGMA table_info({TABLE})")]:
+                    c.execute(f"DROP TABLE {TABLE}")  # old layout: a second copy of every payload
+                c.execute(f"""CREATE TABLE IF NOT EXISTS {TABLE}(
+                  office_code TEXT PRIMARY KEY, report_datetime TEXT NOT NULL, expires_at REAL)""")
+        else:
+            self.db = None
+            self.archive = None
+
+    def _count(self, key: str, code: str):
+        with self.lock:
+            self.stats[key] += 1
+            self.key_stats.setdefault(code, Counter())[key] += 1
+
+    def _remember(self, code: str, entry):
+        with self.lock:
+            self.entries[code] = entry
+            self.entries.move_to_end(code)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def _entry(self, code: str):
+        with self.lock:
+            entry = self.entries.get(code)
+            if entry is not None:
+                self.entries.move_to_end(code)
+                return entry, "hits"
+        if self.db is None:
+            return None, None
+        row = self.db.read().execute(
+            f"SELECT report_datetime, expires_at FROM {TABLE} WHERE office_code=?", (code,)).fetchone()
+        if row is None:
+            return None, None
+        try:
+            payload = self.archive.payload(code, row["report_datetime"])
+        except KeyError:
+            return None, None  # the report was never archived
+        entry = (row["report_datetime"], row["expires_at"], payload)
+        self._remember(code, entry)
+        return entry, "db_hits"
+
+    def lookup(self, code: str):
+        """(payload, fresh) for code: fresh=False means it is due for a refetch."""
+        entry, source = self._entry(code)
+        if entry is None:
+            self._count("misses", code)
+            return None, False
+        if time.time() >= entry[1]:
+            self._count("expired", code)
+            return entry[2], False
+        self._count(source, code)
+        return entry[2], True
+
+    def fresh(self, code: str) -> bool:
+        """True if get() would answer from the cache; counts nothing."""
+        entry, _ = self._entry(code)
+        return entry is not None and time.time() < entry[1]
+
+    def store(self, code: str, payload):
+        now = time.time()
+        report = report_datetime(payload)
+        expires = expires_at(payload, now)
+        if expires <= now:
+            # the next release should be out but is not yet: ask again soon
+            self._count("late", code)
+            expires = now + RECHECK_SEC
+        # the raw reportDatetime is the archive's key; without one the entry stays in memory
+        entry = (payload[0]["reportDatetime"] if report else None, expires, payload)
+        self._remember(code, entry)
+        if self.db is not None and report is not None:
+            with self.db.write() as c:
+                c.execute(f"INSERT OR REPLACE INTO {TABLE} VALUES(?,?,?)", (code, entry[0], expires))
+
+    def _refreshed(self, code: str, stale, fetched=None, error: Optional[Exception] = None):
+        if error is not None:
+            if stale is None:
+                raise error
+            self._count("stale", code)
+            return stale
+        self.store(code, fetched)
+        return fetched
+
+    def get(self, code: str, fetch: Callable[[str], object]):
+        """Cached payload for code, calling fetch(code) only when it may have changed.
+
+        If the refetch fails, an expired entry is returned rather than nothing.
+        """
+        payload, fresh = self.lookup(code)
+        if fresh:
+            return payload
+
+        def refetch():
+            try:
+                new = fetch(code)
+            except Exception as e:
+                return self._refreshed(code, payload, error=e)
+            return self._refreshed(code, payload, new)
+
+        return self.flight.do(code, refetch)
+
+    async def get_async(self, code: str, fetch: Callable[[str], Awaitable[object]]):
+        """get() for a coroutine fetch, shared by concurrent callers on the loop."""
+        payload, fresh = self.lookup(code)
+        if fresh:
+            return payload
+
+        async def refetch():
+            try:
+                new = await fetch(code)
+            except Exception as e:
+                return self._refreshed(code, payload, error=e)
+            return self._refreshed(code, payload, new)
+
+        return await self.flight.do_async(code, refetch)
+
+    def key_summary(self, code: str) -> dict:
+        """Counters of one office: cache hits/misses/... plus single-flight calls/coalesced."""
+        with self.lock:
+            out = dict(self.key_stats.get(code, {}))
+        with self.flight.lock:
+            out.update(self.flight.stats.get(code, {}))
+        return out
+
+    def summary(self) -> str:
+        with self.lock:
+            s = dict(self.stats)
+        total = s["hits"] + s["db_hits"] + s["misses"] + s["expired"]
+        rate = (s["hits"] + s["db_hits"]) / total if total else 0.0
+        return (f"forecast cache: {s['hits']} hits, {s['db_hits']} from DB, {s['misses']} misses, "
+                f"{s['expired']} expired ({s['late']} refetched before the release was out, {s['stale']} served stale), "
+                f"hit rate {rate:.0%}; {self.flight.summary()}")
@@ -0,0 +1,80 @@
+"""Headless ingest: today's forecast of every JMA office into weather_min.db.
+
+Reuses the app's load_area, fetch_forecast and save_snapshot code, fetches
+the offices on a bounded thread pool and writes all snapshots in one
+transaction. Runs are idempotent (snapshots are upserts, forecasts go
+through the JMA-schedule cache), so cron can run it several times a day:
+between releases a run makes no requests and changes no rows.
+
+    python ingest.py [--workers 8] [--db weather_min.db]
+
+    # crontab: shortly after each release (05/11/17 JST)
+    15 5,11,17 * * *  cd /path/to/src && python ingest.py >> ingest.log 2>&1
+"""
+import argparse
+import math
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import main
+
+
+def fetch_one(code: str) -> tuple[list[str], list[str], float]:
+    t = time.perf_counter()
+    dates, weathers = main.fetch_forecast(code)
+    return dates, weathers, time.perf_counter() - t
+
+
+def ingest(workers: int) -> int:
+    started = time.perf_counter()
+    main.db_init()
+    _, offices = main.load_area()
+    cache = main.forecasts()
+    misses_before = cache.stats["misses"] + cache.stats["expired"]
+
+    fetched, latencies, failed = [], [], []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest") as pool:
+        futures = {pool.submit(fetch_one, code): code for code in offices}
+        for f in as_completed(futures):
+            code = futures[f]
+            try:
+                dates, weathers, sec = f.result()
+            except Exception as e:
+                failed.append(code)
+                print(f"  ! {code} {offices[code]['name']}: {e!r}")
+                continue
+            fetched.append((code, offices[code]["name"], dates, weathers))
+            latencies.append(sec)
+    fetch_sec = time.perf_counter() - started
+
+    changed = main.save_snapshots(fetched)
+    total = time.perf_counter() - started
+    requests = cache.stats["misses"] + cache.stats["expired"] - misses_before
+
+    print(f"[{datetime.now().isoformat(timespec='seconds')}] {main.DB}: "
+          f"{len(fetched)}/{len(offices)} offices, {requests} requested from JMA, {changed} snapshot rows changed")
+    if latencies:
+        ms = sorted(x * 1000 for x in latencies)
+        p95 = ms[math.ceil(len(ms) * 0.95) - 1]
+        print(f"  {len(fetched) / fetch_sec:.1f} offices/s with {workers} workers; "
+              f"per office p50 {statistics.median(ms):.0f} ms, p95 {p95:.0f} ms, max {ms[-1]:.0f} ms; "
+              f"total {total:.2f}s (write {total - fetch_sec:.3f}s)")
+    print(f"  {cache.summary()}")
+    print(f"  {main.archive().summary()}")
+    return 1 if failed else 0
+
+
+def main_cli() -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--workers", type=int, default=8, help="offices fetched at once")
+    p.add_argument("--db", default=main.DB)
+    args = p.parse_args()
+    main.DB = args.db
+    return ingest(args.workers)
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
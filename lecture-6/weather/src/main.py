@@ -1,12 +1,35 @@
+import asyncio
 import flet as ft
+import httpx
 import requests
 import sqlite3
+import threading
 from datetime import date, datetime
+from typing import Optional
+
+from archive import ForecastArchive
+from db import get_db
+from forecast_cache import ForecastCache
+from prefetch import Prefetcher
+from single_flight import SharedValues
+import ui
 
 AREA_URL = "https://www.jma.go.jp/bosai/common/const/area.json"
 FORECAST_URL = "https://www.jma.go.jp/bosai/forecast/data/forecast/{code}.json"
 DB = "weather_min.db"
 
+# one row per office, day and forecast slot; a repeated fetch updates it in place
+SNAPSHOT_UPSERT = """
+INSERT INTO snapshots(office_code,office_name,saved_date,saved_at,idx,forecast_date,weather)
+VALUES(?,?,?,?,?,?,?)
+ON CONFLICT(office_code, saved_date, idx) DO UPDATE SET
+  office_name=excluded.office_name, saved_at=excluded.saved_at,
+  forecast_date=excluded.forecast_date, weather=excluded.weather
+WHERE snapshots.weather IS NOT excluded.weather
+   OR snapshots.forecast_date IS NOT excluded.forecast_date
+   OR snapshots.office_name IS NOT excluded.office_name
+"""
+
 
 def icons(w: str) -> list[str]:
     out = []
@@ -22,33 +45,75 @@ def is_pref(name: str) -> bool:
     return any(x in name for x in ("都", "道", "府", "県"))
 
 
-def con():
-    c = sqlite3.connect(DB)
-    c.row_factory = sqlite3.Row
-    return c
+_forecasts: dict[str, ForecastCache] = {}
+_archives: dict[str, ForecastArchive] = {}
+_forecasts_lock = threading.RLock()
+
+
+def forecasts() -> ForecastCache:
+    """The process-wide forecast cache, stored next to the snapshots in DB."""
+    with _forecasts_lock:
+        if DB not in _forecasts:
+            _forecasts[DB] = ForecastCache(DB, archive=archive())
+        return _forecasts[DB]
+
+
+def archive() -> ForecastArchive:
+    """Every full forecast response downloaded, compressed, in DB."""
+    with _forecasts_lock:
+        if DB not in _archives:
+            _archives[DB] = ForecastArchive(DB)
+        return _archives[DB]
 
 
 def db_init():
-    c = con(); cur = c.cursor()
-    cur.execute("CREATE TABLE IF NOT EXISTS centers(code TEXT PRIMARY KEY, name TEXT)")
-    cur.execute("CREATE TABLE IF NOT EXISTS offices(code TEXT PRIMARY KEY, name TEXT, center_code TEXT)")
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS snapshots(
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      office_code TEXT,
-      office_name TEXT,
-      saved_date TEXT,
-      saved_at TEXT,
-      idx INTEGER,
-      forecast_date TEXT,
-      weather TEXT
-    )""")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_snap ON snapshots(office_code, saved_date)")
-    c.commit(); c.close()
+    with get_db(DB).write() as c:
+        c.execute("CREATE TABLE IF NOT EXISTS centers(code TEXT PRIMARY KEY, name TEXT)")
+        c.execute("CREATE TABLE IF NOT EXISTS offices(code TEXT PRIMARY KEY, name TEXT, center_code TEXT)")
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS snapshots(
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          office_code TEXT,
+          office_name TEXT,
+          saved_date TEXT,
+          saved_at TEXT,
+          idx INTEGER,
+          forecast_date TEXT,
+          weather TEXT
+        )""")
+    try:
+        with get_db(DB).write() as c:
+            c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_snap_key ON snapshots(office_code, saved_date, idx)")
+            # idx_snap_key covers (office_code, saved_date) lookups as well
+            c.execute("DROP INDEX IF EXISTS idx_snap")
+    except sqlite3.IntegrityError:
+        # a database from before the unique key, with one copy per click
+        print(f"{DB}: removed {compact_snapshots()} duplicate snapshot rows")
+
+
+def compact_snapshots() -> int:
+    """Keep the newest row per (office_code, saved_date, idx) and add the unique key."""
+    with get_db(DB).write() as c:
+        removed = c.execute("""
+          DELETE FROM snapshots WHERE id NOT IN (
+            SELECT MAX(id) FROM snapshots GROUP BY office_code, saved_date, idx)
+        """).rowcount
+        c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_snap_key ON snapshots(office_code, saved_date, idx)")
+        c.execute("DROP INDEX IF EXISTS idx_snap")
+    return removed
+
+
+AREA_TTL = 24 * 60 * 60
+# centers/offices for every session of the process, read (or downloaded) once a day
+areas = SharedValues(AREA_TTL)
 
 
 def load_area():
-    c = con(); cur = c.cursor()
+    return areas.get(DB, _load_area)
+
+
+def _load_area():
+    cur = get_db(DB).read()
     n = cur.execute("SELECT COUNT(*) n FROM centers").fetchone()["n"]
     if n > 0:
         centers = {}
@@ -59,59 +124,99 @@ def load_area():
             offices[r["code"]] = {"name": r["name"]}
             if r["center_code"] in centers:
                 centers[r["center_code"]]["children"].append(r["code"])
-        c.close()
         return centers, offices
 
-    c.close()
     area = requests.get(AREA_URL, timeout=10).json()
     centers = area.get("centers", {})
     offices = area.get("offices", {})
 
-    c = con(); cur = c.cursor()
-    for cc, info in centers.items():
-        cur.execute("INSERT OR REPLACE INTO centers VALUES(?,?)", (cc, info.get("name", cc)))
-    for cc, info in centers.items():
-        for oc in info.get("children", []):
-            if oc in offices:
-                cur.execute(
-                    "INSERT OR REPLACE INTO offices VALUES(?,?,?)",
-                    (oc, offices[oc].get("name", oc), cc),
-                )
-    c.commit(); c.close()
-    return load_area()
+    with get_db(DB).write() as c:
+        c.executemany(
+            "INSERT OR REPLACE INTO centers VALUES(?,?)",
+            [(cc, info.get("name", cc)) for cc, info in centers.items()],
+        )
+        c.executemany(
+            "INSERT OR REPLACE INTO offices VALUES(?,?,?)",
+            [(oc, offices[oc].get("name", oc), cc)
+             for cc, info in centers.items() for oc in info.get("children", []) if oc in offices],
+        )
+    return _load_area()
 
 
-def fetch_forecast(office_code: str) -> tuple[list[str], list[str]]:
+_client: Optional[httpx.AsyncClient] = None
+
+
+def http() -> httpx.AsyncClient:
+    """One pooled client for the event loop all sessions' handlers run on."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=10)
+    return _client
+
+
+def download_forecast(office_code: str):
     data = requests.get(FORECAST_URL.format(code=office_code), timeout=10).json()
+    archive().add(office_code, data)
+    return data
+
+
+async def download_forecast_async(office_code: str):
+    r = await http().get(FORECAST_URL.format(code=office_code))
+    r.raise_for_status()
+    data = r.json()
+    # zstd at level 19 plus a DB write: keep it off the loop every session shares
+    await asyncio.to_thread(archive().add, office_code, data)
+    return data
+
+
+def parse_forecast(data) -> tuple[list[str], list[str]]:
     ts = data[0]["timeSeries"][0]
     dates = [t[:10] for t in ts.get("timeDefines", [])]
     weathers = ts["areas"][0]["weathers"]
     return dates, weathers
 
 
+def fetch_forecast(office_code: str) -> tuple[list[str], list[str]]:
+    return parse_forecast(forecasts().get(office_code, download_forecast))
+
+
+async def fetch_forecast_async(office_code: str) -> tuple[list[str], list[str]]:
+    return parse_forecast(await forecasts().get_async(office_code, download_forecast_async))
+
+
 def save_snapshot(office_code: str, office_name: str, dates: list[str], weathers: list[str]):
+    save_snapshots([(office_code, office_name, dates, weathers)])
+
+
+def save_snapshots(items: list[tuple[str, str, list[str], list[str]]]) -> int:
+    """(office_code, office_name, dates, weathers) of many offices in one transaction.
+
+    Returns the number of snapshot rows inserted or changed.
+    """
     sd = date.today().isoformat()
     sa = datetime.now().isoformat(timespec="seconds")
-    c = con(); cur = c.cursor()
-    for i in range(min(3, len(weathers), len(dates))):
-        cur.execute(
-            """INSERT INTO snapshots
-            (office_code,office_name,saved_date,saved_at,idx,forecast_date,weather)
-            VALUES(?,?,?,?,?,?,?)""",
-            (office_code, office_name, sd, sa, i, dates[i], weathers[i]),
-        )
-    c.commit(); c.close()
+    rows = [(code, name, sd, sa, i, dates[i], weathers[i])
+            for code, name, dates, weathers in items
+            for i in range(min(3, len(weathers), len(dates)))]
+    with get_db(DB).write() as c:
+        before = c.total_changes
+        c.executemany(SNAPSHOT_UPSERT, rows)
+        return c.total_changes - before
+
+
+async def warm_office(office_code: str, office_name: str):
+    """Background prefetch of one office: fill the forecast cache and save today's snapshot."""
+    dates, weathers = await fetch_forecast_async(office_code)
+    save_snapshot(office_code, office_name, dates, weathers)
 
 
 def load_snapshot(office_code: str, saved_date: str):
-    c = con(); cur = c.cursor()
-    rows = cur.execute("""
+    rows = get_db(DB).read().execute("""
       SELECT office_name,saved_at,forecast_date,idx,weather
       FROM snapshots
       WHERE office_code=? AND saved_date=?
       ORDER BY idx
     """, (office_code, saved_date)).fetchall()
-    c.close()
     if not rows:
         return None
     name = rows[0]["office_name"]
@@ -122,14 +227,12 @@ def load_snapshot(office_code: str, saved_date: str):
 
 
 def saved_dates(office_code: str) -> list[str]:
-    c = con(); cur = c.cursor()
-    rows = cur.execute("""
+    rows = get_db(DB).read().execute("""
       SELECT DISTINCT saved_date
       FROM snapshots
       WHERE office_code=?
       ORDER BY saved_date DESC
     """, (office_code,)).fetchall()
-    c.close()
     return [r["saved_date"] for r in rows]
 
 
@@ -143,68 +246,99 @@ def main(page: ft.Page):
     center_bar = ft.Row(wrap=True, spacing=6)
     pref_list = ft.Column(width=320, scroll=ft.ScrollMode.AUTO)
 
-    big = ft.Row()
+    # built once; render() only changes values and visibility, so an update
+    # carries the few changed attributes instead of a new control tree
+    icon_texts = [ft.Text("", size=40, visible=False) for _ in range(5)]
+    big = ft.Row(icon_texts)
     title = ft.Text("選んでね", size=20, weight=ft.FontWeight.BOLD)
     sub = ft.Text("")
-    cards = ft.Column()
+    cache_info = ft.Text("", size=11, color=ft.Colors.GREY)
+    card_rows = []
+    for label in ["今日", "明日", "明後日"]:
+        cells = [ft.Text(label, width=50), ft.Text("", width=110), ft.Text("", width=50), ft.Text("", expand=True)]
+        card_rows.append(ft.Row(cells, visible=False))
+    cards = ft.Column(card_rows)
 
     cur_code = {"v": None}
     cur_name = {"v": None}
+    # the show_latest task of the newest selection; older ones are cancelled
+    latest = {"task": None}
+
+    prefetcher = Prefetcher(warm_office)
+    meter = ui.UpdateMeter(page)
+
+    async def on_disconnect(e):
+        meter.close()
+        prefetcher.cancel()
+        if latest["task"]:
+            latest["task"].cancel()
+
+    page.on_disconnect = on_disconnect
 
     def render(name: str, code: str, note: str, dates: list[str], weathers: list[str]):
-        big.controls = [ft.Text(ic, size=40) for ic in icons(weathers[0] if weathers else "")]
+        big_icons = icons(weathers[0] if weathers else "")
+        for i, t in enumerate(icon_texts):
+            t.visible = i < len(big_icons)
+            if t.visible:
+                t.value = big_icons[i]
         title.value = f"{name}（{code}）"
         sub.value = note
-
-        cards.controls = []
-        labels = ["今日", "明日", "明後日"]
-        for i in range(min(3, len(weathers))):
-            cards.controls.append(
-                ft.Row([
-                    ft.Text(labels[i], width=50),
-                    ft.Text(dates[i] if i < len(dates) else "", width=110),
-                    ft.Text("".join(icons(weathers[i])), width=50),
-                    ft.Text(weathers[i], expand=True),
-                ])
-            )
-        page.update()
+        counts = ", ".join(f"{n} {k}" for k, n in forecasts().key_summary(code).items())
+        cache_info.value = (f"{forecasts().summary()} / {code}: {counts} / area: {areas.summary()} / "
+                            f"{prefetcher.summary()} / {meter.summary()}")
+
+        for i, row in enumerate(card_rows):
+            row.visible = i < min(3, len(weathers))
+            if row.visible:
+                _, d, ic, w = row.controls
+                d.value = dates[i] if i < len(dates) else ""
+                ic.value = "".join(icons(weathers[i]))
+                w.value = weathers[i]
+        ui.update(page)
 
     def refresh_dd():
-        if not cur_code["v"]:
-            dd.options = []
-            dd.value = None
-            page.update()
-            return
-
-        ds = saved_dates(cur_code["v"])
-        dd.options = [ft.dropdown.Option(d) for d in ds]
+        ds = saved_dates(cur_code["v"]) if cur_code["v"] else []
+        if [o.key for o in dd.options] != ds:
+            dd.options = [ft.dropdown.Option(d) for d in ds]
         dd.value = ds[0] if ds else None
-        page.update()
+        ui.update(page)
 
-    def show_latest(code: str, name: str):
+    async def show_latest(code: str, name: str, interaction: Optional[str] = "prefecture"):
+        if interaction:
+            meter.start(interaction)
         cur_code["v"], cur_name["v"] = code, name
+        task, prev = asyncio.current_task(), latest["task"]
+        latest["task"] = task
+        if prev and prev is not task and not prev.done():
+            prev.cancel()
+        if not forecasts().fresh(code):  # a cache hit renders at once: skip the loading state
+            render(name, code, "取得中…", [], [])
+
         try:
-            dates, weathers = fetch_forecast(code)
+            dates, weathers = await fetch_forecast_async(code)
 
             save_snapshot(code, name, dates, weathers)
 
             sd = date.today().isoformat()
             res = load_snapshot(code, sd)
 
-            if res:
-                n2, saved_at, d2, w2 = res
-                render(n2, code, f"DB保存: {sd} / {saved_at}", d2, w2)
-            else:
-                render(name, code, "保存後のDB読込失敗", [], [])
+            with ui.batch():
+                if res:
+                    n2, saved_at, d2, w2 = res
+                    render(n2, code, f"DB保存: {sd} / {saved_at}", d2, w2)
+                else:
+                    render(name, code, "保存後のDB読込失敗", [], [])
+                refresh_dd()
 
         except Exception:
-            render(name, code, "取得失敗", [], [])
-
-        refresh_dd()
+            with ui.batch():
+                render(name, code, "取得失敗", [], [])
+                refresh_dd()
 
     def show_saved(saved_date: str):
         if not (cur_code["v"] and saved_date):
             return
+        meter.start("saved")
         res = load_snapshot(cur_code["v"], saved_date)
         if not res:
             render(cur_name["v"] or "", cur_code["v"], f"{saved_date} の保存なし", [], [])
@@ -223,14 +357,16 @@ def main(page: ft.Page):
         ft.Row([
             dd,
             ft.ElevatedButton("日付選択", on_click=lambda e: picker.pick_date()),
-            ft.FilledButton("最新取得", on_click=lambda e: show_latest(cur_code["v"], cur_name["v"]) if cur_code["v"] else None),
+            ft.FilledButton("最新取得", on_click=lambda e: page.run_task(show_latest, cur_code["v"], cur_name["v"], "refresh") if cur_code["v"] else None),
         ], wrap=True),
         ft.Row([big, ft.Column([title, sub])]),
         ft.Divider(),
         cards,
+        cache_info,
     ], expand=True)
 
-    def build_prefs(center_code: str):
+    async def build_prefs(center_code: str):
+        meter.start("region")
         pref_list.controls = []
         children = centers.get(center_code, {}).get("children", [])
 
@@ -247,17 +383,20 @@ def main(page: ft.Page):
                 ft.ListTile(
                     title=ft.Text(nm),
                     subtitle=ft.Text(oc),
-                    on_click=lambda e, c=oc, n=nm: show_latest(c, n),
+                    on_click=lambda e, c=oc, n=nm: page.run_task(show_latest, c, n),
                 )
             )
 
-        page.update()
+        prefetcher.start([(oc, nm) for nm, oc in items[1:]])
         if items:
-            show_latest(items[0][1], items[0][0])
+            # the list goes out with show_latest's loading state, in one update
+            await show_latest(items[0][1], items[0][0], interaction=None)
+        else:
+            ui.update(page)
 
     for cc, info in sorted(centers.items(), key=lambda x: x[1].get("name", x[0])):
         center_bar.controls.append(
-            ft.ElevatedButton(info.get("name", cc), on_click=lambda e, c=cc: build_prefs(c))
+            ft.ElevatedButton(info.get("name", cc), on_click=lambda e, c=cc: page.run_task(build_prefs, c))
         )
 
     page.add(
@@ -272,7 +411,8 @@ def main(page: ft.Page):
 
     first = next(iter(centers.keys()), None)
     if first:
-        build_prefs(first)
+        page.run_task(build_prefs, first)
 
 
-ft.app(main)
+if __name__ == "__main__":
+    ft.app(main)
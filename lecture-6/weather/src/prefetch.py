@@ -0,0 +1,63 @@
+"""Fetch every office of the selected region in the background.
+
+As soon as a region is picked, all of its offices are fetched as asyncio
+tasks, so the following clicks find the forecast already cached. Picking
+another region cancels the tasks of the previous one, including requests
+already in flight that no other session waits for. The WORKERS slots are
+shared by the whole process (all `flet run --web` sessions run on one
+event loop). A click on an office that is being prefetched joins that
+request in ForecastCache.
+"""
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+WORKERS = 4
+
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def _semaphore() -> asyncio.Semaphore:
+    # created on first use, inside the running loop (Python 3.9 binds it at creation)
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(WORKERS)
+    return _slots
+
+
+class Prefetcher:
+    """One per page. fetch(code, name) is a coroutine doing the work (cache fill, DB write).
+
+    All methods must be called on the event loop.
+    """
+
+    def __init__(self, fetch: Callable[[str, str], Awaitable[object]]):
+        self.fetch = fetch
+        self.tasks: dict[str, asyncio.Task] = {}
+        self.stats = {"queued": 0, "done": 0, "failed": 0, "cancelled": 0}
+
+    async def _run(self, code: str, name: str):
+        async with _semaphore():
+            try:
+                await self.fetch(code, name)
+            except Exception:
+                self.stats["failed"] += 1
+                return
+            self.stats["done"] += 1
+
+    def start(self, offices: list[tuple[str, str]]):
+        """Start (code, name) pairs, cancelling whatever the previous region left."""
+        self.cancel()
+        for code, name in offices:
+            self.tasks[code] = asyncio.create_task(self._run(code, name))
+            self.stats["queued"] += 1
+
+    def cancel(self):
+        for t in self.tasks.values():
+            if not t.done():
+                t.cancel()
+                self.stats["cancelled"] += 1
+        self.tasks = {}
+
+    def summary(self) -> str:
+        s = self.stats
+        return f"prefetch: {s['done']} done, {s['failed']} failed, {s['cancelled']} cancelled of {s['queued']} queued"
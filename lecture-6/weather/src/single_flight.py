@@ -0,0 +1,124 @@
+"""Collapse concurrent calls for the same key into one call.
+
+With `flet run --web` every session runs main(page) in the same process, so
+50 users opening Tokyo at once would mean 50 identical requests to JMA.
+Through SingleFlight the first caller (the leader) makes the request and
+the others wait for its result. SharedValues adds a process-wide memo on
+top, for data every session needs (area.json).
+"""
+import asyncio
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class _AsyncCall:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: dict[Hashable, Future] = {}
+        self.async_calls: dict[Hashable, _AsyncCall] = {}
+        self.stats: dict[Hashable, Counter] = {}
+
+    def _count(self, key: Hashable, what: str):
+        with self.lock:
+            self.stats.setdefault(key, Counter())[what] += 1
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """fn() for threads; callers arriving while it runs get the same result or exception."""
+        with self.lock:
+            f = self.calls.get(key)
+            leader = f is None
+            if leader:
+                f = self.calls[key] = Future()
+        self._count(key, "calls" if leader else "coalesced")
+        if not leader:
+            return f.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            f.set_exception(e)
+            raise
+        else:
+            f.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """await fn() on the event loop, shared by every concurrent caller.
+
+        A cancelled caller only stops waiting; the call itself is cancelled
+        when its last waiter is gone.
+        """
+        call = self.async_calls.get(key)
+        if call is None:
+            call = self.async_calls[key] = _AsyncCall(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda t: self.async_calls.pop(key, None)
+                                        if self.async_calls.get(key) is call else None)
+            self._count(key, "calls")
+        else:
+            self._count(key, "coalesced")
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def summary(self, top: int = 3) -> str:
+        with self.lock:
+            calls = sum(c["calls"] for c in self.stats.values())
+            coalesced = sum(c["coalesced"] for c in self.stats.values())
+            busiest = sorted(self.stats.items(), key=lambda kv: -kv[1]["coalesced"])[:top]
+        keys = ", ".join(f"{k} {c['coalesced']}" for k, c in busiest if c["coalesced"])
+        return f"single-flight: {calls} requests, {coalesced} coalesced" + (f" ({keys})" if keys else "")
+
+
+class SharedValues:
+    """fn() results by key, loaded once (single-flight) and kept for ttl seconds.
+
+    At most maxsize keys are kept, least recently used first out.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 16):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.values: OrderedDict[Hashable, tuple[float, object]] = OrderedDict()
+        self.flight = SingleFlight()
+
+    def get(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self.flight.lock:
+            hit = self.values.get(key)
+            if hit is not None and time.monotonic() - hit[0] < self.ttl:
+                self.values.move_to_end(key)
+                self.flight.stats.setdefault(key, Counter())["hits"] += 1
+                return hit[1]
+
+        def load():
+            value = fn()
+            with self.flight.lock:
+                self.values[key] = (time.monotonic(), value)
+                self.values.move_to_end(key)
+                while len(self.values) > self.maxsize:
+                    self.values.popitem(last=False)
+            return value
+
+        return self.flight.do(key, load)
+
+    def summary(self) -> str:
+        with self.flight.lock:
+            parts = [f"{k}: {c['hits']} hits, {c['calls']} loads, {c['coalesced']} coalesced"
+                     for k, c in self.flight.stats.items()]
+        return "; ".join(parts) or "nothing loaded"
@@ -0,0 +1,141 @@
+"""Vectorized cleaning, classification and aggregation of ski resort tables.
+
+Works on the DataFrame from pd.read_sql("SELECT * FROM ski_resorts", conn)
+or columnar.load_resorts(); nothing here loops over rows.
+
+    python analytics.py --rows 1000000   # benchmark on a synthetic table
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+PCT_COLUMNS = ["beginner_pct", "intermediate_pct", "advanced_pct"]
+
+SUM_MIN = 95
+SUM_MAX = 105
+EXCLUDE_URL_PATTERNS = ("/special/",)
+
+BEGINNER_MIN = 50
+ADVANCED_MIN = 30
+
+TYPES = ["Beginner-friendly", "Advanced-oriented", "Balanced"]
+
+
+def valid_mask(df: pd.DataFrame, sum_min: int = SUM_MIN, sum_max: int = SUM_MAX,
+               exclude_url_patterns: Sequence[str] = EXCLUDE_URL_PATTERNS) -> pd.Series:
+    """Rows with all three percentages whose sum is within [sum_min, sum_max]."""
+    s = sum(df[c].to_numpy(dtype="float64", na_value=np.nan) for c in PCT_COLUMNS)
+    mask = (s >= sum_min) & (s <= sum_max)  # NaN (any pct missing) compares False
+    for pattern in exclude_url_patterns:
+        mask &= ~df["url"].str.contains(pattern, regex=False, na=False).to_numpy(dtype=bool)
+    return pd.Series(mask, index=df.index)
+
+
+def clean(df: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    return df[valid_mask(df, **kwargs)]
+
+
+def classify(df: pd.DataFrame, beginner_min: int = BEGINNER_MIN, advanced_min: int = ADVANCED_MIN) -> pd.Series:
+    """Same rules as the notebook's classify_resort, first match wins:
+    beginner >= beginner_min -> Beginner-friendly, advanced >= advanced_min ->
+    Advanced-oriented, otherwise Balanced."""
+    b = df["beginner_pct"].to_numpy(dtype="float64", na_value=np.nan)
+    a = df["advanced_pct"].to_numpy(dtype="float64", na_value=np.nan)
+    codes = np.select([b >= beginner_min, a >= advanced_min], [0, 1], default=2)
+    return pd.Series(pd.Categorical.from_codes(codes, TYPES), index=df.index, name="type")
+
+
+def with_type(df: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    return df.assign(type=classify(df, **kwargs))
+
+
+def type_summary(df: pd.DataFrame) -> pd.DataFrame:
+    """Resort count and mean percentages per type (df needs a type column)."""
+    g = df.groupby("type", observed=True)[PCT_COLUMNS]
+    out = g.mean()
+    out.insert(0, "count", g.size())
+    return out.sort_values("count", ascending=False)
+
+
+def prefecture_summary(df: pd.DataFrame) -> pd.DataFrame:
+    """Per prefecture: resort count, mean percentages and share of each type."""
+    g = df.groupby("prefecture", observed=True)
+    out = g[PCT_COLUMNS].mean()
+    out.insert(0, "count", g.size())
+    if "type" in df:
+        shares = pd.crosstab(df["prefecture"], df["type"], normalize="index")
+        out = out.join(shares.add_prefix("share_"))
+    return out.sort_values("count", ascending=False)
+
+
+def synthetic(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Random table shaped like ski_resorts, with some invalid rows mixed in."""
+    rng = np.random.default_rng(seed)
+    b = rng.integers(0, 80, rows)
+    m = rng.integers(0, 101 - b)
+    a = 100 - b - m + rng.integers(-8, 9, rows)
+    df = pd.DataFrame({
+        "prefecture": pd.Categorical.from_codes(rng.integers(0, 47, rows), [f"pref{i:02d}" for i in range(1, 48)]),
+        "url": np.where(rng.random(rows) < 0.01, "https://surfsnow.jp/special/x/", "https://surfsnow.jp/guide/htm/r0001s.htm"),
+        "kencd": rng.integers(1, 48, rows).astype("int8"),
+        "beginner_pct": pd.array(b, dtype="Int8"),
+        "intermediate_pct": pd.array(m, dtype="Int8"),
+        "advanced_pct": pd.array(np.clip(a, 0, 100), dtype="Int8"),
+    })
+    df.loc[rng.random(rows) < 0.02, "advanced_pct"] = pd.NA
+    return df
+
+
+def _classify_rowwise(row) -> str:
+    if row["beginner_pct"] >= BEGINNER_MIN:
+        return "Beginner-friendly"
+    if row["advanced_pct"] >= ADVANCED_MIN:
+        return "Advanced-oriented"
+    return "Balanced"
+
+
+def bench(rows: int, apply_rows: int) -> None:
+    df = synthetic(rows)
+    print(f"synthetic table: {rows:,} rows, {df.memory_usage(deep=True).sum() / 2**20:.1f} MiB")
+
+    t = time.perf_counter()
+    use = clean(df)
+    t_clean = time.perf_counter() - t
+    t = time.perf_counter()
+    use = with_type(use)
+    t_classify = time.perf_counter() - t
+    t = time.perf_counter()
+    type_summary(use)
+    prefecture_summary(use)
+    t_agg = time.perf_counter() - t
+    print(f"  clean     {t_clean * 1000:8.1f} ms  ({len(use):,} rows kept)")
+    print(f"  classify  {t_classify * 1000:8.1f} ms")
+    print(f"  aggregate {t_agg * 1000:8.1f} ms")
+
+    sample = use.head(apply_rows)
+    t = time.perf_counter()
+    ref = sample.apply(_classify_rowwise, axis=1)
+    t_apply = time.perf_counter() - t
+    same = (ref.to_numpy() == use["type"].head(apply_rows).astype(str).to_numpy()).all()
+    per_row = t_apply / max(len(sample), 1)
+    print(f"  apply(axis=1) on {len(sample):,} rows: {t_apply * 1000:.1f} ms "
+          f"(~{per_row * len(use):.1f} s for all rows, vectorized x{per_row * len(use) / t_classify:.0f}); "
+          f"same labels: {same}")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.add_argument("--apply-rows", type=int, default=100_000,
+                   help="rows to time the old row-wise apply on (extrapolated to --rows)")
+    args = p.parse_args()
+    bench(args.rows, args.apply_rows)
+
+
+if __name__ == "__main__":
+    main()
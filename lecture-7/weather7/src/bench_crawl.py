@@ -0,0 +1,130 @@
+"""End-to-end crawler benchmark against replay_server.py.
+
+Each run starts main.py in a fresh temporary directory, pointed at a local
+replay of the recorded corpus, and reports pages/sec, CPU time and peak RSS
+of the crawler process (its parse workers included). The resulting CSV is
+compared with a golden CSV, ignoring fetched_at and row order. Options
+that are not listed below go to main.py.
+
+    python bench_crawl.py --write-golden golden.csv --max-pages 0 --max-resorts 0
+    python bench_crawl.py --golden golden.csv --engine async --concurrency 8 --latency 80 --runs 3
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from replay_server import ReplayServer, add_fault_args, faults_from_args
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_PY = os.path.join(SRC_DIR, "main.py")
+
+
+def read_rows(path: str) -> Dict[str, Dict[str, str]]:
+    """url path -> row without fetched_at; the host differs between live and replay runs."""
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = {}
+        for r in csv.DictReader(f):
+            r.pop("fetched_at", None)
+            r["url"] = urlparse(r["url"]).path
+            rows[r["url"]] = r
+    return rows
+
+
+def compare(got: Dict[str, Dict[str, str]], golden: Dict[str, Dict[str, str]]) -> Tuple[int, int, int]:
+    """(missing, extra, changed) row counts."""
+    missing = len(golden.keys() - got.keys())
+    extra = len(got.keys() - golden.keys())
+    changed = sum(1 for u in golden.keys() & got.keys() if golden[u] != got[u])
+    return missing, extra, changed
+
+
+def run_once(server_url: str, crawler_args: List[str], sleep_sec: float, workdir: str) -> Dict:
+    env = {**os.environ, "CRAWL_BASE_URL": server_url, "CRAWL_SLEEP_SEC": str(sleep_sec), "MPLBACKEND": "Agg"}
+    log_path = os.path.join(workdir, "crawl.log")
+    with open(log_path, "w", encoding="utf-8") as log:
+        t = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, MAIN_PY, *crawler_args], cwd=workdir, env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+        # wait4 gives the rusage of this child and the workers it waited for
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - t
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    pages = 0
+    metrics_path = os.path.join(workdir, "output", "metrics.json")
+    if os.path.exists(metrics_path):
+        with open(metrics_path, encoding="utf-8") as f:
+            counters = json.load(f)["counters"]
+        pages = int(sum(s["value"] for s in counters.get("crawl_http_responses_total", [])))
+    rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    return {
+        "exit": proc.returncode, "wall": wall, "pages": pages, "pages_per_sec": pages / wall,
+        "cpu": usage.ru_utime + usage.ru_stime, "rss_mb": rss / 2**20,
+        "csv": os.path.join(workdir, "output", "ski_resorts.csv"), "log": log_path,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_fault_args(p)
+    p.add_argument("--runs", type=int, default=1)
+    p.add_argument("--sleep", type=float, default=0.0,
+                   help="CRAWL_SLEEP_SEC for every run, whatever the engine: main.py's default --rate is "
+                        "1/sleep (0: unlimited); an explicit --rate overrides it")
+    p.add_argument("--golden", help="CSV the crawl output must match")
+    p.add_argument("--write-golden", help="save the first run's CSV here")
+    p.add_argument("--keep", action="store_true", help="keep the run directories")
+    args, crawler_args = p.parse_known_args(argv)
+    crawler_args = ["--no-cache", *crawler_args]
+    golden = read_rows(args.golden) if args.golden else None
+
+    results = []
+    failed = False
+    with ReplayServer(args.corpus, faults=faults_from_args(args), origin=args.origin, seed=args.seed) as server:
+        print(f"Replaying {len(server.pages)} pages on {server.url}; main.py {' '.join(crawler_args)}")
+        for i in range(1, args.runs + 1):
+            workdir = tempfile.mkdtemp(prefix="bench_crawl_")
+            r = run_once(server.url, crawler_args, args.sleep, workdir)
+            results.append(r)
+            line = (f"  run {i}: {r['pages']} pages in {r['wall']:.2f}s = {r['pages_per_sec']:.1f} pages/s, "
+                    f"cpu {r['cpu']:.2f}s, peak rss {r['rss_mb']:.0f} MiB")
+            if r["exit"] != 0 or not os.path.exists(r["csv"]):
+                failed = True
+                print(f"{line}\n    ! crawler exited with {r['exit']}, see {r['log']}")
+                continue
+            got = read_rows(r["csv"])
+            if golden is not None:
+                missing, extra, changed = compare(got, golden)
+                ok = not (missing or extra or changed)
+                failed |= not ok
+                line += f", golden {'OK' if ok else f'MISMATCH (missing {missing}, extra {extra}, changed {changed})'}"
+            print(line)
+            if args.write_golden and i == 1:
+                with open(r["csv"], encoding="utf-8") as src, open(args.write_golden, "w", encoding="utf-8") as dst:
+                    dst.write(src.read())
+                print(f"  Saved golden -> {args.write_golden} ({len(got)} rows)")
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+        print(f"  server responses: {dict(sorted(server.stats.items()))}")
+
+    ok_runs = [r for r in results if r["exit"] == 0]
+    if len(ok_runs) > 1:
+        print(f"  median: {statistics.median(r['pages_per_sec'] for r in ok_runs):.1f} pages/s, "
+              f"cpu {statistics.median(r['cpu'] for r in ok_runs):.2f}s, "
+              f"peak rss {max(r['rss_mb'] for r in ok_runs):.0f} MiB")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Parity check and micro-benchmark: fast scanner vs full BeautifulSoup parse.
+
+Fixtures are either *.html files in a directory or the bodies recorded in the
+crawler's HTTP cache (output/http_cache.db after a normal run). fixtures/
+holds a few small list and resort pages with entities, malformed markup and
+missing fields; --check runs only the parity check and exits 1 on a mismatch.
+
+    python bench_parse.py                 # pages from output/http_cache.db
+    python bench_parse.py fixtures/ -n 5  # *.html in fixtures/
+    python bench_parse.py --check         # parity on fixtures/, no timing
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+import time
+from dataclasses import asdict
+from typing import Callable, List, Tuple
+
+from main import (
+    CACHE_PATH,
+    extract_resort_links_from_list,
+    extract_resort_links_from_list_bs4,
+    parse_resort_page,
+    parse_resort_page_bs4,
+)
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixtures(src: str) -> List[Tuple[str, str]]:
+    if os.path.isdir(src):
+        pages = []
+        for path in sorted(glob.glob(os.path.join(src, "*.html"))):
+            with open(path, encoding="utf-8") as f:
+                pages.append((path, f.read()))
+        return pages
+    conn = sqlite3.connect(src)
+    rows = conn.execute("SELECT url, body FROM responses ORDER BY url").fetchall()
+    conn.close()
+    return [(u, b) for u, b in rows]
+
+
+def record(resort) -> dict:
+    d = asdict(resort)
+    d.pop("fetched_at")
+    return d
+
+
+def check_parity(pages: List[Tuple[str, str]]) -> int:
+    bad = 0
+    for url, html in pages:
+        fast, ref = record(parse_resort_page(url, html, None)), record(parse_resort_page_bs4(url, html, None))
+        if fast != ref:
+            bad += 1
+            print(f"  ! resort mismatch {url}\n    fast: {fast}\n    bs4:  {ref}")
+        if extract_resort_links_from_list(html) != extract_resort_links_from_list_bs4(html):
+            bad += 1
+            print(f"  ! link mismatch {url}")
+    return bad
+
+
+def bench(name: str, fn: Callable[[str, str], object], pages: List[Tuple[str, str]], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for url, html in pages:
+            fn(url, html)
+        best = min(best, time.perf_counter() - t)
+    print(f"  {name:<24} {best * 1000:9.1f} ms  ({best / len(pages) * 1000:.2f} ms/page)")
+    return best
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("src", nargs="?", default=None,
+                   help=f"fixture directory or http_cache.db (default: {CACHE_PATH}, with --check: fixtures/)")
+    p.add_argument("-n", "--repeat", type=int, default=3)
+    p.add_argument("--check", action="store_true", help="parity check only")
+    args = p.parse_args()
+    if args.src is None:
+        args.src = FIXTURES_DIR if args.check else CACHE_PATH
+
+    pages = load_fixtures(args.src)
+    if not pages:
+        print(f"No fixtures in {args.src}")
+        sys.exit(1)
+    size = sum(len(h.encode("utf-8")) for _, h in pages)
+    print(f"{len(pages)} pages, {size / 1024:.0f} KiB")
+
+    bad = check_parity(pages)
+    print(f"parity: {'OK' if not bad else f'{bad} mismatches'}")
+    if args.check:
+        sys.exit(1 if bad else 0)
+
+    print("resort pages:")
+    slow = bench("bs4 parse_resort_page", lambda u, h: parse_resort_page_bs4(u, h, None), pages, args.repeat)
+    fast = bench("fast parse_resort_page", lambda u, h: parse_resort_page(u, h, None), pages, args.repeat)
+    print(f"  speedup x{slow / fast:.1f}")
+    print("list pages:")
+    slow = bench("bs4 links", lambda u, h: extract_resort_links_from_list_bs4(h), pages, args.repeat)
+    fast = bench("fast links", lambda u, h: extract_resort_links_from_list(h), pages, args.repeat)
+    print(f"  speedup x{slow / fast:.1f}")
+    sys.exit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
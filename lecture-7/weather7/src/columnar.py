@@ -0,0 +1,128 @@
+"""Columnar (Parquet / Arrow IPC) copy of the ski resort data.
+
+    python columnar.py                      # output/ski.db -> output/ski_resorts.parquet
+    python columnar.py --src output/ski_resorts.csv --out output/ski_resorts.arrow
+
+Parquet is compact (zstd, dictionary-encoded strings); an .arrow file is
+uncompressed Arrow IPC and can be memory-mapped without any decoding.
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import sqlite3
+from pathlib import Path
+from typing import List, Optional, Union
+
+SRC_DIR = Path(__file__).resolve().parent
+
+DB_PATH = SRC_DIR / "output" / "ski.db"
+PARQUET_PATH = SRC_DIR / "output" / "ski_resorts.parquet"
+
+TABLE_NAME = "ski_resorts"
+
+
+def schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("name", pa.string()),
+        ("prefecture", pa.dictionary(pa.int16(), pa.string())),
+        ("url", pa.string()),
+        ("kencd", pa.int8()),
+        ("beginner_pct", pa.int8()),
+        ("intermediate_pct", pa.int8()),
+        ("advanced_pct", pa.int8()),
+        ("fetched_at", pa.timestamp("s")),
+    ])
+
+
+def read_source(src: Union[str, Path]):
+    """ski.db (table ski_resorts) or a crawler CSV as a typed pyarrow Table."""
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    src = Path(src)
+    target = schema()
+    if src.suffix == ".csv":
+        opts = pacsv.ConvertOptions(
+            column_types={f.name: (pa.string() if f.name == "prefecture" else f.type) for f in target},
+            strings_can_be_null=True,
+        )
+        table = pacsv.read_csv(src, convert_options=opts)
+    else:
+        conn = sqlite3.connect(src)
+        cur = conn.execute(f"SELECT {', '.join(target.names)} FROM {TABLE_NAME} ORDER BY url")
+        cols = list(zip(*cur.fetchall())) or [[] for _ in target.names]
+        conn.close()
+        arrays = {}
+        for f, values in zip(target, cols):
+            if f.name == "fetched_at":
+                arrays[f.name] = pa.array(values, pa.string()).cast(pa.timestamp("s"))
+            elif f.name == "prefecture":
+                arrays[f.name] = pa.array(values, pa.string())
+            else:
+                arrays[f.name] = pa.array(values, f.type)
+        table = pa.table(arrays)
+    table = table.select(target.names)
+    table = table.set_column(1, "prefecture", table["prefecture"].dictionary_encode().cast(target.field("prefecture").type))
+    return table.cast(target)
+
+
+def export(src: Union[str, Path] = DB_PATH, out: Union[str, Path] = PARQUET_PATH) -> Path:
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    table = read_source(src)
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    if out.suffix == ".arrow":
+        feather.write_feather(table, out, compression="uncompressed")
+    else:
+        pq.write_table(table, out, compression="zstd", row_group_size=64 * 1024)
+    print(f"Saved {out.suffix[1:]} -> {out} ({table.num_rows} rows)")
+    return out
+
+
+def export_if_available(src: Union[str, Path] = DB_PATH, out: Union[str, Path] = PARQUET_PATH) -> None:
+    if importlib.util.find_spec("pyarrow") is None:
+        print("pyarrow not installed. Skip columnar export.")
+        return
+    export(src, out)
+
+
+def load_table(path: Union[str, Path] = PARQUET_PATH, columns: Optional[List[str]] = None, filter=None):
+    """Memory-mapped scan with column projection and predicate pushdown.
+
+    filter is a pyarrow.dataset expression, e.g.
+    ``(ds.field("kencd") == 20) & (ds.field("beginner_pct") >= 50)``. With
+    Parquet, row groups whose statistics rule the predicate out are skipped.
+    """
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    path = Path(path)
+    fmt = "ipc" if path.suffix == ".arrow" else "parquet"
+    dataset = ds.dataset(str(path), format=fmt, filesystem=fs.LocalFileSystem(use_mmap=True))
+    return dataset.to_table(columns=columns, filter=filter)
+
+
+def load_resorts(path: Union[str, Path] = PARQUET_PATH, columns: Optional[List[str]] = None, filter=None):
+    """load_table() as a DataFrame: prefecture becomes categorical, pct/kencd nullable Int8."""
+    import pandas as pd
+    import pyarrow as pa
+
+    table = load_table(path, columns, filter)
+    return table.to_pandas(types_mapper={pa.int8(): pd.Int8Dtype()}.get)
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--src", default=str(DB_PATH), help="ski.db or ski_resorts.csv")
+    p.add_argument("--out", default=str(PARQUET_PATH), help=".parquet or .arrow")
+    args = p.parse_args()
+    export(args.src, args.out)
+
+
+if __name__ == "__main__":
+    main()
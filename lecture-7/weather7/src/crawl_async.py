@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Callable, List, Optional, Sequence, Set, Tuple
+
+import httpx
+import requests
+
+from fingerprints import FingerprintStore
+from frontier import Frontier
+from http_cache import HttpCache
+from metrics import METRICS
+from politeness import THROTTLE_STATUS, HostLimiter, is_transient, response_status, retry_after
+from main import (
+    BASE_URL,
+    HEADERS,
+    MAX_PAGES,
+    MAX_RESORTS,
+    TIMEOUT_SEC,
+    Resort,
+    ResortTable,
+    classify_url,
+    enough_candidates,
+    ensure_dirs,
+    extract_resort_links_from_list,
+    list_page_urls,
+    parse_checked,
+    pending_resort_urls,
+    record_reject,
+    report_pruned,
+)
+
+
+def as_requests_error(e: httpx.HTTPError) -> requests.RequestException:
+    """The exception fetch_html raises for the same failure, so the retry and
+    politeness rules (is_transient, response_status, ...) apply unchanged."""
+    if isinstance(e, httpx.TimeoutException):
+        return requests.Timeout(str(e))
+    if isinstance(e, httpx.TransportError):
+        return requests.ConnectionError(str(e))
+    return requests.RequestException(str(e))
+
+
+def decode_body(resp: httpx.Response, body: bytes) -> str:
+    # same rule as fetch_html: a missing or ISO-8859-1 charset means "detect it" (requests' apparent_encoding)
+    encoding = resp.charset_encoding
+    if encoding is None or encoding.lower() == "iso-8859-1":
+        encoding = requests.compat.chardet.detect(body)["encoding"]
+    try:
+        return str(body, encoding or "utf-8", errors="replace")
+    except LookupError:
+        return str(body, "utf-8", errors="replace")
+
+
+async def fetch_html_async(url: str, client: httpx.AsyncClient, cache: Optional[HttpCache] = None) -> str:
+    """fetch_html on an httpx.AsyncClient: same headers, cache revalidation, metrics and errors."""
+    kind = classify_url(url)
+    with METRICS.time("crawl_fetch_seconds", kind=kind):
+        headers = HEADERS
+        entry = cache.lookup(url) if cache else None
+        if entry:
+            headers = {**HEADERS, **entry.validators()}
+        try:
+            with METRICS.time("crawl_stage_seconds", stage="connect_wait"):
+                resp = await client.send(client.build_request("GET", url, headers=headers), stream=True)
+            try:
+                with METRICS.time("crawl_stage_seconds", stage="download"):
+                    body = await resp.aread()
+            finally:
+                await resp.aclose()
+        except httpx.HTTPError as e:
+            err = as_requests_error(e)
+            METRICS.inc("crawl_fetch_errors_total", error=type(err).__name__)
+            raise err from e
+        METRICS.inc("crawl_http_responses_total", status=resp.status_code)
+        METRICS.inc("crawl_http_response_bytes_total", len(body), kind=kind)
+        if entry and resp.status_code == 304:
+            return cache.hit(entry)
+        if resp.status_code >= 400:
+            side = "Client" if resp.status_code < 500 else "Server"
+            raise requests.HTTPError(f"{resp.status_code} {side} Error: {resp.reason_phrase} for url: {url}",
+                                     response=resp)
+        with METRICS.time("crawl_stage_seconds", stage="decode"):
+            text = decode_body(resp, body)
+        if cache:
+            cache.store(url, text, resp.headers, revalidated=entry is not None)
+        return text
+
+
+async def fetch_with_retry_async(url: str, client: httpx.AsyncClient, cache: Optional[HttpCache],
+                                 limiter: HostLimiter) -> str:
+    """fetch_with_retry for the event loop: token waits and backoff are asyncio sleeps."""
+    policy = limiter.policy(url)
+    retry = limiter.retry
+    for attempt in range(retry.retries + 1):
+        policy.breaker.check()
+        await policy.bucket.acquire_async()
+        t = time.perf_counter()
+        try:
+            html = await fetch_html_async(url, client, cache)
+        except requests.RequestException as e:
+            status = response_status(e)
+            wait = retry_after(e)
+            if status in THROTTLE_STATUS:
+                policy.aimd.on_throttle()
+                if wait:
+                    policy.bucket.hold(wait)
+            if not is_transient(e):
+                if status is not None:
+                    policy.breaker.on_success()  # e.g. a 404: the host itself is fine
+                raise
+            policy.breaker.on_failure()
+            if attempt == retry.retries:
+                raise
+            delay = max(retry.backoff(attempt), wait or 0.0)
+            METRICS.inc("crawl_retries_total", reason=str(status or type(e).__name__))
+            print(f"    ! {status or type(e).__name__} for {url}; retry {attempt + 1}/{retry.retries} in {delay:.1f}s")
+            with METRICS.time("crawl_stage_seconds", stage="backoff"):
+                await asyncio.sleep(delay)
+            continue
+        policy.aimd.on_success(time.perf_counter() - t)
+        policy.breaker.on_success()
+        return html
+    raise AssertionError("unreachable")
+
+
+class AsyncCrawler:
+    """Requests go out on one httpx.AsyncClient, at most `concurrency` at a time;
+    only parsing (CPU bound) is handed to a small thread pool."""
+
+    def __init__(self, concurrency: int, rate: float, burst: int = 1, cache: Optional[HttpCache] = None,
+                 limiter: Optional[HostLimiter] = None, fingerprints: Optional[FingerprintStore] = None):
+        self.cache = cache
+        self.fingerprints = fingerprints
+        self.concurrency = max(1, concurrency)
+        self.limiter = limiter or HostLimiter(rate, burst)
+        self.sem = asyncio.Semaphore(self.concurrency)
+        self.client = httpx.AsyncClient(timeout=TIMEOUT_SEC, follow_redirects=True,
+                                        limits=httpx.Limits(max_connections=self.concurrency))
+        self.pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="parse")
+
+    async def fetch(self, url: str) -> str:
+        async with self.sem:
+            return await fetch_with_retry_async(url, self.client, self.cache, self.limiter)
+
+    async def fetch_resort(self, url: str, kencd: int) -> Tuple[Resort, Optional[str]]:
+        html = await self.fetch(url)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.pool, parse_checked, url, html, kencd, self.fingerprints)
+
+    async def warm_up(self, base_url: str) -> None:
+        # the cookies it sets stay in the client
+        await self.limiter.wait(base_url)
+        try:
+            await self.client.get(base_url, headers=HEADERS)
+        except httpx.HTTPError:
+            pass
+
+    async def collect_links(self, frontier: Frontier, max_pages: int, max_resorts: int,
+                            kencds: Optional[Sequence[int]] = None) -> None:
+        print("[1/3] Collecting resort links from list pages...")
+        for list_url, kencd in list_page_urls(max_pages, kencds):
+            frontier.add(list_url, kencd, "list")
+        list_urls = [] if enough_candidates(frontier, max_resorts) else frontier.pending("list")
+        pruned: Set[str] = set()
+
+        async def one(i: int, list_url: str) -> Optional[List[str]]:
+            try:
+                html = await self.fetch(list_url)
+                print(f"  - Fetched list page ({i}/{len(list_urls)}): {list_url}")
+                return extract_resort_links_from_list(html, pruned)
+            except requests.RequestException as e:
+                frontier.mark_failed(list_url, str(e))
+                print(f"    ! Failed to fetch list page: {list_url}: {e}")
+                return None
+
+        def journal(list_url: str, kencd: int, links: Optional[List[str]]) -> None:
+            if links is None:
+                return
+            for u in links:
+                frontier.add(u, kencd, "resort")
+            frontier.mark_done(list_url)
+
+        if max_resorts:
+            # one page at a time, stopping as soon as there are enough candidates,
+            # so the engine fetches exactly the list pages the sequential one does
+            for i, (list_url, kencd) in enumerate(list_urls, start=1):
+                journal(list_url, kencd, await one(i, list_url))
+                if enough_candidates(frontier, max_resorts):
+                    break
+        else:
+            # every page is needed: fetch them all at once, journal in list-page order
+            results = await asyncio.gather(*(one(i, u) for i, (u, _) in enumerate(list_urls, start=1)))
+            for (list_url, kencd), links in zip(list_urls, results):
+                journal(list_url, kencd, links)
+
+        report_pruned(pruned, frontier)
+
+    async def crawl_resorts(self, frontier: Frontier, max_resorts: int,
+                            on_resort: Optional[Callable[[Resort], None]] = None) -> ResortTable:
+        print("[2/3] Crawling resort pages and extracting difficulty percentages...")
+        done = ResortTable.from_records(frontier.results())
+        if len(done):
+            print(f"  Resuming with {len(done)} resorts already in the journal")
+        resort_urls = pending_resort_urls(frontier)
+        queue: asyncio.Queue = asyncio.Queue()
+        for idx, (url, kencd) in enumerate(resort_urls, start=1):
+            queue.put_nowait((idx, url, kencd))
+
+        found: List[Tuple[int, Resort]] = []
+
+        def enough() -> bool:
+            return bool(max_resorts) and len(done) + len(found) >= max_resorts
+
+        async def worker() -> None:
+            # workers take URLs in frontier order and stop taking new ones once enough
+            # resorts are found; pages still in flight then are dropped (left pending in
+            # the journal), so on_resort sees exactly max_resorts resorts
+            while not enough():
+                try:
+                    idx, url, kencd = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    resort, reason = await self.fetch_resort(url, kencd)
+                except requests.RequestException as e:
+                    frontier.mark_failed(url, str(e))
+                    print(f"  - ({idx}/{len(resort_urls)}) {url}\n    ! Failed: {e}")
+                    continue
+                if enough():
+                    return
+                print(f"  - ({idx}/{len(resort_urls)}) {url}")
+                if reason is None:
+                    METRICS.inc("crawl_resorts_total", result="valid")
+                    if on_resort:
+                        on_resort(resort)
+                    frontier.mark_done(url, asdict(resort))
+                    found.append((idx, resort))
+                    print(f"    OK: {resort.name} | 初級{resort.beginner_pct}% 中級{resort.intermediate_pct}% 上級{resort.advanced_pct}%")
+                else:
+                    record_reject(frontier, url, reason)
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+
+        found.sort(key=lambda x: x[0])
+        resorts = done
+        resorts.extend(r for _, r in found)
+        if max_resorts:
+            resorts = resorts.head(max_resorts)
+        print(f"  Extracted {len(resorts)} resorts with valid difficulty data")
+        return resorts
+
+
+async def _crawl(concurrency: int, rate: float, burst: int, cache: Optional[HttpCache],
+                 frontier: Frontier, max_pages: int, max_resorts: int,
+                 on_resort: Optional[Callable[[Resort], None]],
+                 limiter: Optional[HostLimiter],
+                 fingerprints: Optional[FingerprintStore],
+                 kencds: Optional[Sequence[int]]) -> ResortTable:
+    crawler = AsyncCrawler(concurrency, rate, burst, cache, limiter, fingerprints)
+    try:
+        await crawler.warm_up(BASE_URL + "/")
+        await crawler.collect_links(frontier, max_pages, max_resorts, kencds)
+        return await crawler.crawl_resorts(frontier, max_resorts, on_resort)
+    finally:
+        crawler.pool.shutdown(wait=False, cancel_futures=True)
+        await crawler.client.aclose()
+
+
+def crawl_async(concurrency: int = 4, rate: float = 1.0, burst: int = 1,
+                cache: Optional[HttpCache] = None, frontier: Optional[Frontier] = None,
+                max_pages: int = MAX_PAGES, max_resorts: int = MAX_RESORTS,
+                on_resort: Optional[Callable[[Resort], None]] = None,
+                limiter: Optional[HostLimiter] = None,
+                fingerprints: Optional[FingerprintStore] = None,
+                kencds: Optional[Sequence[int]] = None) -> ResortTable:
+    ensure_dirs()
+    return asyncio.run(_crawl(concurrency, rate, burst, cache, frontier or Frontier(),
+                              max_pages, max_resorts, on_resort, limiter, fingerprints, kencds))
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import re
+from html.entities import html5
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+
+# same tag sets bs4's html.parser tree builder uses
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem",
+    "meta", "param", "source", "track", "wbr",
+    "basefont", "bgsound", "command", "frame", "image", "isindex", "nextid", "spacer",
+}
+# strings inside these are not part of get_text()
+HIDDEN_TEXT_TAGS = {"script", "style", "template", "rt", "rp"}
+
+LABELS = ("初級", "中級", "上級")
+LABEL_RE = {label: re.compile(rf"{label}\s*[:：]?\s*([0-9]{{1,3}})\s*%") for label in LABELS}
+# label, optional colon, digits and "%" can each sit in their own text node
+WINDOW = 4
+FEED_CHUNK = 16 * 1024
+
+DEC_CHARREF_RE = re.compile(r"^([0-9]+)(.*)", re.S)
+HEX_CHARREF_RE = re.compile(r"^([0-9a-f]+)(.*)", re.S)
+# &name; table bs4's html.parser builder looks names up in (html5 keys without the ";")
+ENTITIES = {name.rstrip(";"): text for name, text in html5.items()}
+
+
+def charref(name: str) -> str:
+    """Text for &#name; the way bs4's html.parser builder decodes it.
+
+    0x80-0x9f are read as windows-1252 (&#150; is an en dash), NUL,
+    surrogates and out-of-range numbers become U+FFFD, and anything after
+    the digits of a malformed reference stays as text.
+    """
+    base, reg = 10, DEC_CHARREF_RE
+    if name[:1] in ("x", "X"):
+        name, base, reg = name[1:], 16, HEX_CHARREF_RE
+    try:
+        n, extra = int(name, base), ""
+    except ValueError:
+        m = reg.match(name)
+        if m is None:
+            return name
+        n, extra = int(m.group(1), base), m.group(2)
+    if n == 0 or n > 0x10FFFF or 0xD800 <= n <= 0xDFFF:
+        return "\ufffd" + extra
+    if 0x80 <= n <= 0x9F:
+        try:
+            return bytes([n]).decode("cp1252") + extra
+        except UnicodeDecodeError:
+            pass
+    return chr(n) + extra
+
+
+class _Scanner(HTMLParser):
+    """Tag/text event stream with just enough bookkeeping to mirror what
+    BeautifulSoup(html, "html.parser") would return for the fields we read."""
+
+    def __init__(self, want_links: bool = False, want_page: bool = False):
+        super().__init__(convert_charrefs=False)
+        self.want_links = want_links
+        self.want_page = want_page
+        self.stack: List[str] = []
+        self.already_closed: List[str] = []
+        self.hidden = 0
+        self.buf: List[str] = []
+
+        self.hrefs: List[str] = []
+
+        self.texts: List[str] = []
+        self.scanned = 0
+        self.pcts: Dict[str, Optional[int]] = {}
+        self.h1: Optional[List[str]] = None
+        self.h1_depth = 0
+        self.h1_open = False
+        self.title: Optional[List[str]] = None
+        self.title_depth = 0
+        self.title_open = False
+
+    # -- text nodes ---------------------------------------------------------
+
+    def flush(self) -> None:
+        if not self.buf:
+            return
+        s = "".join(self.buf).strip()
+        self.buf = []
+        if s and not self.hidden:
+            self.add_text(s)
+
+    def add_text(self, s: str) -> None:
+        if not self.want_page:
+            return
+        self.texts.append(s)
+        if self.h1_open:
+            self.h1.append(s)
+        if self.title_open:
+            self.title.append(s)
+
+    def handle_data(self, data: str) -> None:
+        if self.want_page:
+            self.buf.append(data)
+
+    def handle_entityref(self, name: str) -> None:
+        self.buf.append(ENTITIES.get(name, "&" + name))
+
+    def handle_charref(self, name: str) -> None:
+        self.buf.append(charref(name))
+
+    def handle_comment(self, data: str) -> None:
+        self.flush()
+
+    def handle_decl(self, decl: str) -> None:
+        self.flush()
+
+    def handle_pi(self, data: str) -> None:
+        self.flush()
+
+    def unknown_decl(self, data: str) -> None:
+        self.flush()
+        if data.upper().startswith("CDATA["):
+            s = data[len("CDATA["):].strip()
+            if s:
+                self.add_text(s)
+
+    # -- tags ---------------------------------------------------------------
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        self.handle_starttag(tag, attrs, void=False)
+        self.handle_endtag(tag, check_already_closed=False)
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]], void: bool = True) -> None:
+        self.flush()
+        if tag == "a" and self.want_links:
+            href = None
+            for k, v in attrs:
+                if k == "href":
+                    href = v or ""
+            if href is not None:
+                self.hrefs.append(href)
+        self.stack.append(tag)
+        if tag in HIDDEN_TEXT_TAGS:
+            self.hidden += 1
+        if tag == "h1" and self.h1 is None:
+            self.h1, self.h1_depth, self.h1_open = [], len(self.stack), True
+        if tag == "title" and self.title is None:
+            self.title, self.title_depth, self.title_open = [], len(self.stack), True
+        if void and tag in VOID_TAGS:
+            self.handle_endtag(tag, check_already_closed=False)
+            self.already_closed.append(tag)
+
+    def handle_endtag(self, tag: str, check_already_closed: bool = True) -> None:
+        self.flush()
+        if check_already_closed and tag in self.already_closed:
+            self.already_closed.remove(tag)
+            return
+        if tag not in self.stack:
+            return
+        while self.stack:
+            t = self.stack.pop()
+            if t in HIDDEN_TEXT_TAGS:
+                self.hidden -= 1
+            if len(self.stack) < self.h1_depth:
+                self.h1_open = False
+            if len(self.stack) < self.title_depth:
+                self.title_open = False
+            if t == tag:
+                break
+
+    # -- difficulty percentages ---------------------------------------------
+
+    def scan_pcts(self, final: bool = False) -> None:
+        """Run the extract_difficulty_pcts regexes over text windows.
+
+        A match starts at a label inside one text node and spans at most
+        WINDOW nodes, so joining node i with the next few nodes finds exactly
+        the matches re.search would find on soup.get_text(" ", strip=True).
+        """
+        end = len(self.texts) if final else len(self.texts) - WINDOW + 1
+        for i in range(self.scanned, max(end, self.scanned)):
+            s = self.texts[i]
+            if "級" not in s:
+                continue
+            window = None
+            for label in LABELS:
+                if label in self.pcts:
+                    continue
+                pos = s.find(label)
+                while pos != -1:
+                    if window is None:
+                        window = " ".join(self.texts[i:i + WINDOW])
+                    m = LABEL_RE[label].match(window, pos)
+                    if m:
+                        v = int(m.group(1))
+                        self.pcts[label] = v if 0 <= v <= 100 else None
+                        break
+                    pos = s.find(label, pos + 1)
+        self.scanned = max(end, self.scanned)
+
+    def page_done(self) -> bool:
+        return (len(self.pcts) == len(LABELS)
+                and self.h1 is not None and not self.h1_open
+                and self.title is not None and not self.title_open)
+
+
+def scan_links(html: str) -> List[str]:
+    """href of every <a href> in document order, like soup.select("a[href]")."""
+    p = _Scanner(want_links=True)
+    p.feed(html)
+    p.close()
+    return p.hrefs
+
+
+def scan_resort_page(html: str) -> Tuple[Optional[List[str]], Optional[List[str]],
+                                          Tuple[Optional[int], Optional[int], Optional[int]]]:
+    """Return (h1 strings, title strings, (beginner, intermediate, advanced)).
+
+    The string lists are what get_text(strip=True) would join for the first
+    <h1> and <title>, or None when the tag is missing. Stops reading once
+    every field is known.
+    """
+    p = _Scanner(want_page=True)
+    for start in range(0, len(html), FEED_CHUNK):
+        p.feed(html[start:start + FEED_CHUNK])
+        p.scan_pcts()
+        if p.page_done():
+            break
+    else:
+        p.close()
+        p.flush()
+        p.scan_pcts(final=True)
+    return p.h1, p.title, tuple(p.pcts.get(label) for label in LABELS)
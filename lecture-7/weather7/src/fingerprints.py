@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import resort_db
+from metrics import METRICS
+
+# script/style bodies and comments never reach the parsed fields, and they are
+# where ad tags, tracking ids and timestamps change from one fetch to the next
+NOISE_RE = re.compile(r"<script\b.*?</script\s*>|<style\b.*?</style\s*>|<!--.*?-->", re.S | re.I)
+
+FLUSH_EVERY = 500
+
+
+def fingerprint(html: str) -> str:
+    return hashlib.blake2b(NOISE_RE.sub("", html).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class FingerprintStore:
+    """Content hash of every resort page from earlier crawls, kept in ski.db.
+
+    lookup() returns the stored outcome when a page's fingerprint is unchanged:
+    the Resort row already in ski_resorts (with its original fetched_at) or the
+    reason it was rejected. Callers then skip parse_resort_page entirely.
+    last_seen is updated in bulk, FLUSH_EVERY pages at a time and on close().
+    Any thread may call lookup()/record() (the flush runs on whichever one
+    fills the batch), so every use of the connection holds self.lock.
+    """
+
+    def __init__(self, db_path: str):
+        self.conn = resort_db.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        cols = ", ".join("r." + c for c in resort_db.COLUMNS)
+        rows = self.conn.execute(f"""
+            SELECT f.url, f.content_hash, f.reject_reason, {cols}
+            FROM {resort_db.FINGERPRINT_TABLE} f
+            LEFT JOIN {resort_db.TABLE_NAME} r ON r.url = f.url""").fetchall()
+        self.known: Dict[str, Tuple[str, Optional[str], Optional[dict]]] = {}
+        for url, digest, reason, *resort in rows:
+            stored = dict(zip(resort_db.COLUMNS, resort)) if resort[2] is not None else None
+            self.known[url] = (digest, reason, stored)
+        self.seen: List[Tuple[str, str]] = []
+        self.changed: List[Tuple[str, str, Optional[str], str]] = []
+        self.stats = {"unchanged": 0, "changed": 0, "new": 0}
+
+    def lookup(self, url: str, digest: str) -> Optional[Tuple[dict, Optional[str]]]:
+        """(resort fields, reject reason) recorded for this exact content, else None."""
+        entry = self.known.get(url)
+        if entry is None or entry[0] != digest:
+            return None
+        _, reason, stored = entry
+        if reason is None and stored is None:
+            return None  # valid last time but the row is gone from ski_resorts: parse again
+        with self.lock:
+            self.stats["unchanged"] += 1
+            self.seen.append((self._now(), url))
+            self._maybe_flush()
+        METRICS.inc("crawl_fingerprint_total", result="unchanged")
+        return stored, reason
+
+    def record(self, url: str, digest: str, reason: Optional[str]) -> None:
+        result = "changed" if url in self.known else "new"
+        with self.lock:
+            self.stats[result] += 1
+            self.changed.append((url, digest, reason, self._now()))
+            self._maybe_flush()
+        METRICS.inc("crawl_fingerprint_total", result=result)
+
+    def _now(self) -> str:
+        return datetime.now().isoformat(timespec="seconds")
+
+    def _maybe_flush(self) -> None:
+        if len(self.seen) + len(self.changed) >= FLUSH_EVERY:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not (self.seen or self.changed):
+            return
+        with self.conn:
+            self.conn.executemany(
+                f"UPDATE {resort_db.FINGERPRINT_TABLE} SET last_seen=? WHERE url=?", self.seen)
+            self.conn.executemany(f"""
+                INSERT INTO {resort_db.FINGERPRINT_TABLE}(url, content_hash, reject_reason, last_seen)
+                VALUES(?,?,?,?)
+                ON CONFLICT(url) DO UPDATE SET content_hash=excluded.content_hash,
+                  reject_reason=excluded.reject_reason, last_seen=excluded.last_seen""", self.changed)
+        self.seen = []
+        self.changed = []
+
+    def summary(self) -> str:
+        s = self.stats
+        return f"fingerprints: {s['unchanged']} unchanged (parse skipped), {s['changed']} changed, {s['new']} new"
+
+    def close(self) -> None:
+        with self.lock:
+            self._flush()
+            self.conn.close()
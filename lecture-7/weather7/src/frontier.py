@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+
+MAX_ATTEMPTS = 3
+
+RESULT_FIELDS = ["name", "prefecture", "url", "kencd",
+                 "beginner_pct", "intermediate_pct", "advanced_pct", "fetched_at"]
+
+
+class Frontier:
+    """Crawl frontier journaled to SQLite.
+
+    Every list/resort URL gets a row with its kencd, state (pending / done /
+    rejected / failed), attempt count and last error, and validated resorts are
+    kept in a results table. Rows are committed as they change, so a crawl that
+    dies half way can be resumed from the same file. path=":memory:" gives the
+    same bookkeeping without a file.
+    """
+
+    def __init__(self, path: str = ":memory:", resume: bool = False):
+        if path != ":memory:":
+            d = os.path.dirname(path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            if not resume and os.path.exists(path):
+                os.remove(path)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS frontier(
+          url TEXT PRIMARY KEY,
+          kencd INTEGER,
+          kind TEXT NOT NULL,
+          state TEXT NOT NULL DEFAULT 'pending',
+          attempts INTEGER NOT NULL DEFAULT 0,
+          last_error TEXT,
+          updated_at TEXT
+        )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_frontier_kind ON frontier(kind, state)")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS results(
+          name TEXT,
+          prefecture TEXT,
+          url TEXT PRIMARY KEY,
+          kencd INTEGER,
+          beginner_pct INTEGER,
+          intermediate_pct INTEGER,
+          advanced_pct INTEGER,
+          fetched_at TEXT
+        )""")
+        self.conn.commit()
+
+    def _now(self) -> str:
+        return datetime.now().isoformat(timespec="seconds")
+
+    def add(self, url: str, kencd: Optional[int], kind: str) -> bool:
+        """Queue url unless it is already known. Returns True if it was new."""
+        with self.lock:
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO frontier(url, kencd, kind, updated_at) VALUES(?,?,?,?)",
+                (url, kencd, kind, self._now()),
+            )
+            self.conn.commit()
+            return cur.rowcount > 0
+
+    def known(self, url: str) -> bool:
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM frontier WHERE url=?", (url,)).fetchone() is not None
+
+    def pending(self, kind: str) -> List[Tuple[str, Optional[int]]]:
+        """URLs still to fetch, in the order they were discovered."""
+        with self.lock:
+            rows = self.conn.execute(
+                """SELECT url, kencd FROM frontier
+                WHERE kind=? AND state IN ('pending', 'failed') AND attempts < ?
+                ORDER BY rowid""",
+                (kind, MAX_ATTEMPTS),
+            ).fetchall()
+        return [(r[0], r[1]) for r in rows]
+
+    def count(self, kind: str, state: Optional[str] = None) -> int:
+        sql = "SELECT COUNT(*) FROM frontier WHERE kind=?"
+        args: Tuple[Any, ...] = (kind,)
+        if state:
+            sql += " AND state=?"
+            args += (state,)
+        with self.lock:
+            return self.conn.execute(sql, args).fetchone()[0]
+
+    def _mark(self, url: str, state: str, error: Optional[str] = None) -> None:
+        self.conn.execute(
+            "UPDATE frontier SET state=?, attempts=attempts+1, last_error=?, updated_at=? WHERE url=?",
+            (state, error, self._now(), url),
+        )
+
+    def mark_done(self, url: str, result: Optional[Dict[str, Any]] = None) -> None:
+        with self.lock:
+            self._mark(url, "done")
+            if result is not None:
+                self.conn.execute(
+                    f"INSERT OR REPLACE INTO results VALUES({','.join('?' * len(RESULT_FIELDS))})",
+                    tuple(result[f] for f in RESULT_FIELDS),
+                )
+            self.conn.commit()
+
+    def mark_rejected(self, url: str, reason: str = "") -> None:
+        with self.lock:
+            self._mark(url, "rejected", reason or None)
+            self.conn.commit()
+
+    def mark_failed(self, url: str, error: str) -> None:
+        with self.lock:
+            self._mark(url, "failed", error)
+            self.conn.commit()
+
+    def results(self) -> List[Dict[str, Any]]:
+        """Validated resorts found so far, in frontier order."""
+        with self.lock:
+            rows = self.conn.execute(
+                f"""SELECT {", ".join("r." + f for f in RESULT_FIELDS)}
+                FROM results r JOIN frontier f ON f.url = r.url
+                ORDER BY f.rowid"""
+            ).fetchall()
+        return [dict(zip(RESULT_FIELDS, r)) for r in rows]
+
+    def summary(self) -> str:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT kind, state, COUNT(*) FROM frontier GROUP BY kind, state ORDER BY kind, state"
+            ).fetchall()
+        return ", ".join(f"{k}/{s}: {n}" for k, s, n in rows) or "empty"
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Mapping, Optional
+
+
+TTL_SEC = 14 * 24 * 3600
+MAX_BYTES = 200 * 1024 * 1024
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    body: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    stored_at: float
+
+    def validators(self) -> Dict[str, str]:
+        h: Dict[str, str] = {}
+        if self.etag:
+            h["If-None-Match"] = self.etag
+        if self.last_modified:
+            h["If-Modified-Since"] = self.last_modified
+        return h
+
+
+class HttpCache:
+    """Persistent response store for fetch_html.
+
+    Entries keep the decoded body plus ETag/Last-Modified. Later runs revalidate
+    with conditional requests and serve 304s from disk. Entries older than
+    ttl_sec are dropped, and the least recently used ones go first once the
+    store grows past max_bytes.
+    """
+
+    def __init__(self, path: str, ttl_sec: float = TTL_SEC, max_bytes: int = MAX_BYTES):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self.ttl_sec = ttl_sec
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS responses(
+          url TEXT PRIMARY KEY,
+          body TEXT NOT NULL,
+          etag TEXT,
+          last_modified TEXT,
+          stored_at REAL NOT NULL,
+          last_used REAL NOT NULL,
+          size INTEGER NOT NULL
+        )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_used ON responses(last_used)")
+        self.conn.commit()
+        self.stats = {"hits": 0, "misses": 0, "refreshed": 0, "stored": 0, "evicted": 0}
+        self.evict()
+
+    def lookup(self, url: str) -> Optional[CachedResponse]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE url=?", (url,)
+            ).fetchone()
+        if row is None or time.time() - row[3] > self.ttl_sec:
+            self.count("misses")
+            return None
+        return CachedResponse(url, row[0], row[1], row[2], row[3])
+
+    def hit(self, entry: CachedResponse) -> str:
+        """Server answered 304: the stored body is still current."""
+        with self.lock:
+            now = time.time()
+            self.conn.execute("UPDATE responses SET stored_at=?, last_used=? WHERE url=?", (now, now, entry.url))
+            self.conn.commit()
+            self.stats["hits"] += 1
+        return entry.body
+
+    def store(self, url: str, body: str, headers: Mapping[str, str], revalidated: bool = False) -> None:
+        # bodies without validators are kept too: they cannot be revalidated,
+        # but they still record what the crawl saw
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES(?,?,?,?,?,?,?)",
+                (url, body, headers.get("ETag"), headers.get("Last-Modified"),
+                 now, now, len(body.encode("utf-8"))),
+            )
+            self.conn.commit()
+            self.stats["stored"] += 1
+            if revalidated:
+                self.stats["refreshed"] += 1
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.stats[key] += 1
+
+    def evict(self) -> int:
+        with self.lock:
+            cur = self.conn.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - self.ttl_sec,))
+            n = cur.rowcount
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                rows = self.conn.execute("SELECT url, size FROM responses ORDER BY last_used").fetchall()
+                drop = []
+                for url, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    drop.append((url,))
+                    total -= size
+                self.conn.executemany("DELETE FROM responses WHERE url=?", drop)
+                n += len(drop)
+            self.conn.commit()
+            self.stats["evicted"] += n
+        return n
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"cache: {s['hits']} hits (304), {s['misses']} misses, {s['refreshed']} changed, "
+                f"{s['stored']} stored, {s['evicted']} evicted")
+
+    def close(self) -> None:
+        self.evict()
+        self.conn.close()
@@ -1,26 +1,48 @@
 from __future__ import annotations
 
+import argparse
 import csv
 import os
 import re
+import sys
 import time
-from dataclasses import dataclass, asdict
+from dataclasses import asdict
 from datetime import datetime
-from typing import Iterable, List, Optional, Set, Tuple
-from urllib.parse import urljoin, urlparse
+from typing import Callable, Iterable, List, Optional, Sequence, Set, Tuple
+from urllib.parse import urljoin, urlparse, urlunparse
 
 import requests
 from bs4 import BeautifulSoup
 
+from fastparse import scan_links, scan_resort_page
+from columnar import export_if_available
+from fingerprints import FingerprintStore, fingerprint
+from frontier import Frontier
+from http_cache import HttpCache
+from metrics import METRICS
+from resort_table import Resort, ResortTable
+from politeness import THROTTLE_STATUS, HostLimiter, RetryPolicy, is_transient, response_status, retry_after
+from sink import ResortSink
 
-BASE_URL = "https://surfsnow.jp"
-START_URL = "https://surfsnow.jp/search/list/spl_area01.php"
 
-OUT_DIR = "output"
+# CRAWL_BASE_URL points the crawler at another origin, e.g. replay_server.py;
+# set in the environment so pipeline worker processes see it too
+BASE_URL = os.environ.get("CRAWL_BASE_URL", "https://surfsnow.jp").rstrip("/")
+START_URL = BASE_URL + "/search/list/spl_area01.php"
+
+# shard.py gives every shard process its own output directory
+OUT_DIR = os.environ.get("CRAWL_OUT_DIR", "output")
 CSV_PATH = os.path.join(OUT_DIR, "ski_resorts.csv")
+CACHE_PATH = os.path.join(OUT_DIR, "http_cache.db")
+JOURNAL_PATH = os.path.join(OUT_DIR, "crawl_state.db")
+DB_PATH = os.path.join(OUT_DIR, "ski.db")
+PARQUET_PATH = os.path.join(OUT_DIR, "ski_resorts.parquet")
 PLOT_DIR = os.path.join(OUT_DIR, "plots")
+METRICS_JSON_PATH = os.path.join(OUT_DIR, "metrics.json")
+METRICS_PROM_PATH = os.path.join(OUT_DIR, "metrics.prom")
 
-SLEEP_SEC = 1.5
+SLEEP_SEC = float(os.environ.get("CRAWL_SLEEP_SEC", 1.5))
+DEFAULT_RATE = 1 / max(SLEEP_SEC, 1e-3)  # CRAWL_SLEEP_SEC=0: effectively unlimited
 TIMEOUT_SEC = 20
 MAX_PAGES = 15
 MAX_RESORTS = 150
@@ -35,37 +57,88 @@ HEADERS = {
     ),
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
     "Accept-Language": "ja,en-US;q=0.9,en;q=0.8",
-    "Referer": "https://surfsnow.jp/",
+    "Referer": BASE_URL + "/",
     "Connection": "keep-alive",
     "Upgrade-Insecure-Requests": "1",
 }
 
 
 
-@dataclass
-class Resort:
-    name: str
-    prefecture: Optional[str]
-    url: str
-    kencd: Optional[int]
-    beginner_pct: Optional[int]
-    intermediate_pct: Optional[int]
-    advanced_pct: Optional[int]
-    fetched_at: str
-
-
-
 def ensure_dirs() -> None:
     os.makedirs(OUT_DIR, exist_ok=True)
     os.makedirs(PLOT_DIR, exist_ok=True)
 
 
-def fetch_html(url: str, session: requests.Session) -> str:
-    resp = session.get(url, headers=HEADERS, timeout=TIMEOUT_SEC)
-    resp.raise_for_status()
-    if resp.encoding is None or resp.encoding.lower() == "iso-8859-1":
-        resp.encoding = resp.apparent_encoding
-    return resp.text
+def fetch_html(url: str, session: requests.Session, cache: Optional[HttpCache] = None) -> str:
+    kind = classify_url(url)
+    with METRICS.time("crawl_fetch_seconds", kind=kind):
+        headers = HEADERS
+        entry = cache.lookup(url) if cache else None
+        if entry:
+            headers = {**HEADERS, **entry.validators()}
+        try:
+            # stream=True returns once the headers are in, so the body download is timed on its own
+            with METRICS.time("crawl_stage_seconds", stage="connect_wait"):
+                resp = session.get(url, headers=headers, timeout=TIMEOUT_SEC, stream=True)
+            with METRICS.time("crawl_stage_seconds", stage="download"):
+                body = resp.content
+        except requests.RequestException as e:
+            METRICS.inc("crawl_fetch_errors_total", error=type(e).__name__)
+            raise
+        METRICS.inc("crawl_http_responses_total", status=resp.status_code)
+        METRICS.inc("crawl_http_response_bytes_total", len(body), kind=kind)
+        if entry and resp.status_code == 304:
+            return cache.hit(entry)
+        resp.raise_for_status()
+        with METRICS.time("crawl_stage_seconds", stage="decode"):
+            if resp.encoding is None or resp.encoding.lower() == "iso-8859-1":
+                resp.encoding = resp.apparent_encoding
+            text = resp.text
+        if cache:
+            cache.store(url, text, resp.headers, revalidated=entry is not None)
+        return text
+
+
+def fetch_with_retry(url: str, session: requests.Session, cache: Optional[HttpCache],
+                     limiter: HostLimiter) -> str:
+    """fetch_html behind the host's circuit breaker and token bucket.
+
+    Connection errors, timeouts and 429/5xx answers are retried with jittered
+    exponential backoff (at least Retry-After when the server sends one);
+    429/503 also cut the host's request rate, successes slowly raise it.
+    """
+    policy = limiter.policy(url)
+    retry = limiter.retry
+    for attempt in range(retry.retries + 1):
+        policy.breaker.check()
+        policy.bucket.acquire()
+        t = time.perf_counter()
+        try:
+            html = fetch_html(url, session, cache)
+        except requests.RequestException as e:
+            status = response_status(e)
+            wait = retry_after(e)
+            if status in THROTTLE_STATUS:
+                policy.aimd.on_throttle()
+                if wait:
+                    policy.bucket.hold(wait)
+            if not is_transient(e):
+                if status is not None:
+                    policy.breaker.on_success()  # e.g. a 404: the host itself is fine
+                raise
+            policy.breaker.on_failure()
+            if attempt == retry.retries:
+                raise
+            delay = max(retry.backoff(attempt), wait or 0.0)
+            METRICS.inc("crawl_retries_total", reason=str(status or type(e).__name__))
+            print(f"    ! {status or type(e).__name__} for {url}; retry {attempt + 1}/{retry.retries} in {delay:.1f}s")
+            with METRICS.time("crawl_stage_seconds", stage="backoff"):
+                time.sleep(delay)
+            continue
+        policy.aimd.on_success(time.perf_counter() - t)
+        policy.breaker.on_success()
+        return html
+    raise AssertionError("unreachable")
 
 
 def normalize_url(href: str) -> Optional[str]:
@@ -80,26 +153,60 @@ def normalize_url(href: str) -> Optional[str]:
     return full
 
 
+RESORT_PATH_RE = re.compile(r"^/guide/htm/r(\d+)s\.htm$")
+LIST_PATH_RE = re.compile(r"^/search/list/spl_area\d+\.php$")
+
+
+def canonicalize_url(url: str) -> str:
+    """Scheme/host of BASE_URL, no fragment; resort pages also lose their query."""
+    base = urlparse(BASE_URL)
+    parsed = urlparse(url)
+    query = "" if RESORT_PATH_RE.match(parsed.path) else parsed.query
+    return urlunparse((base.scheme, base.netloc, parsed.path, "", query, ""))
+
+
+def classify_url(url: str) -> str:
+    """'resort' for /guide/htm/rNNNNs.htm detail pages, 'list' for search result pages, else 'other'."""
+    path = urlparse(url).path
+    if RESORT_PATH_RE.match(path):
+        return "resort"
+    if LIST_PATH_RE.match(path):
+        return "list"
+    return "other"
+
+
 def looks_like_resort_url(url: str) -> bool:
-    return any(key in url for key in ("/ski/", "/snow/", "/search/", "/guide/", "gelski", "gelande")) or True
+    return classify_url(url) == "resort"
 
 
-def extract_resort_links_from_list(html: str) -> List[str]:
-    soup = BeautifulSoup(html, "html.parser")
+def filter_resort_links(hrefs: Iterable[str], pruned: Optional[Set[str]] = None) -> List[str]:
+    """Canonical, deduplicated resort-detail URLs ordered by resort id.
+
+    Every other same-host link is dropped before it can reach the frontier and
+    added to pruned, so callers can report how many fetches were avoided.
+    """
     links: Set[str] = set()
 
-    for a in soup.select("a[href]"):
-        href = a.get("href", "")
+    for href in hrefs:
         full = normalize_url(href)
         if not full:
             continue
 
+        full = canonicalize_url(full)
         if looks_like_resort_url(full):
             links.add(full)
-    bad = ("/admin/", "/sp/my/", "/review/my/", "/mailmaga/", "/snolog/")
-    filtered = [u for u in links if not any(b in u for b in bad)]
-    filtered.sort(key=lambda x: ("/search/list/" in x, len(x)))
-    return filtered
+        elif pruned is not None:
+            pruned.add(full)
+    return sorted(links, key=lambda u: int(RESORT_PATH_RE.match(urlparse(u).path).group(1)))
+
+
+def extract_resort_links_from_list(html: str, pruned: Optional[Set[str]] = None) -> List[str]:
+    return filter_resort_links(scan_links(html), pruned)
+
+
+def extract_resort_links_from_list_bs4(html: str, pruned: Optional[Set[str]] = None) -> List[str]:
+    soup = BeautifulSoup(html, "html.parser")
+    return filter_resort_links((a.get("href", "") for a in soup.select("a[href]")), pruned)
 
 
 def extract_prefecture_from_title(text: str) -> Optional[str]:
@@ -134,7 +241,36 @@ def extract_difficulty_pcts(text: str) -> Tuple[Optional[int], Optional[int], Op
     return beginner, intermediate, advanced
 
 
+def make_resort(url: str, kencd: Optional[int], name: str, title_text: str,
+                pcts: Tuple[Optional[int], Optional[int], Optional[int]]) -> Resort:
+    prefecture = extract_prefecture_from_title(name) or extract_prefecture_from_title(title_text)
+    b, m, a = pcts
+
+    return Resort(
+    name=name,
+    prefecture=prefecture,
+    url=url,
+    kencd=kencd,
+    beginner_pct=b,
+    intermediate_pct=m,
+    advanced_pct=a,
+    fetched_at=datetime.now().isoformat(timespec="seconds"),
+)
+
+
 def parse_resort_page(url: str, html: str, kencd: Optional[int]) -> Resort:
+    h1, title, pcts = scan_resort_page(html)
+
+    name = "".join(h1) if h1 else ""
+    if not name:
+        title_joined = "".join(title) if title else ""
+        name = title_joined.split("|")[0].strip() if title_joined else "Unknown"
+
+    title_text = " ".join(title) if title else ""
+    return make_resort(url, kencd, name, title_text, pcts)
+
+
+def parse_resort_page_bs4(url: str, html: str, kencd: Optional[int]) -> Resort:
     soup = BeautifulSoup(html, "html.parser")
 
     h1 = soup.find("h1")
@@ -146,101 +282,187 @@ def parse_resort_page(url: str, html: str, kencd: Optional[int]) -> Resort:
     title_text = ""
     if soup.title:
         title_text = soup.title.get_text(" ", strip=True)
-    prefecture = extract_prefecture_from_title(name) or extract_prefecture_from_title(title_text)
 
     body_text = soup.get_text(" ", strip=True)
-    b, m, a = extract_difficulty_pcts(body_text)
-
-    return Resort(
-    name=name,
-    prefecture=prefecture,
-    url=url,
-    kencd=kencd,
-    beginner_pct=b,
-    intermediate_pct=m,
-    advanced_pct=a,
-    fetched_at=datetime.now().isoformat(timespec="seconds"),
-)
+    return make_resort(url, kencd, name, title_text, extract_difficulty_pcts(body_text))
 
 
 
-def is_valid_resort(resort: Resort) -> bool:
+def reject_reason(resort: Resort) -> Optional[str]:
+    """Why resort fails validation, or None if it is valid."""
     if resort.beginner_pct is None or resort.intermediate_pct is None or resort.advanced_pct is None:
-        return False
+        return "missing difficulty pct"
     s = resort.beginner_pct + resort.intermediate_pct + resort.advanced_pct
-    return 95 <= s <= 105
+    if not 95 <= s <= 105:
+        return "difficulty pct sum out of range"
+    return None
 
 
-def crawl() -> List[Resort]:
-    ensure_dirs()
-    session = requests.Session()
+def is_valid_resort(resort: Resort) -> bool:
+    return reject_reason(resort) is None
+
+
+def record_reject(frontier: Frontier, url: str, reason: str) -> None:
+    METRICS.inc("crawl_resorts_total", result="rejected")
+    METRICS.inc("crawl_rejects_total", reason=reason)
+    frontier.mark_rejected(url, reason)
+
+
+def parse_timed(url: str, html: str, kencd: Optional[int]) -> Resort:
+    with METRICS.time("crawl_stage_seconds", stage="parse"):
+        return parse_resort_page(url, html, kencd)
+
+
+def reused_outcome(url: str, kencd: Optional[int], hit: Tuple[Optional[dict], Optional[str]]) -> Tuple[Resort, Optional[str]]:
+    stored, reason = hit
+    if stored:
+        return Resort(**stored), reason
+    return Resort("", None, url, kencd, None, None, None, ""), reason  # rejected last time, still rejected
+
+
+def parse_checked(url: str, html: str, kencd: Optional[int],
+                  fingerprints: Optional[FingerprintStore] = None) -> Tuple[Resort, Optional[str]]:
+    """(resort, reject reason); pages whose fingerprint is unchanged since the last
+    crawl reuse the stored outcome instead of being parsed again."""
+    if fingerprints is None:
+        resort = parse_timed(url, html, kencd)
+        return resort, reject_reason(resort)
+    digest = fingerprint(html)
+    hit = fingerprints.lookup(url, digest)
+    if hit:
+        return reused_outcome(url, kencd, hit)
+    resort = parse_timed(url, html, kencd)
+    reason = reject_reason(resort)
+    fingerprints.record(url, digest, reason)
+    return resort, reason
+
+
+def warm_up(session: requests.Session) -> None:
     try:
-        session.get("https://surfsnow.jp/", headers=HEADERS, timeout=TIMEOUT_SEC)
-        time.sleep(SLEEP_SEC)
+        session.get(BASE_URL + "/", headers=HEADERS, timeout=TIMEOUT_SEC)
     except requests.RequestException:
         pass
-    print("[1/3] Collecting resort links from list pages...")
-    resort_urls: List[tuple[str, int]] = []
-    seen: Set[str] = set()
 
+
+def parse_kencds(spec: str) -> List[int]:
+    """"1-12,15" -> [1, ..., 12, 15]"""
+    kencds: List[int] = []
+    for part in spec.split(","):
+        lo, _, hi = part.strip().partition("-")
+        kencds.extend(range(int(lo), int(hi or lo) + 1))
+    if not kencds or not all(1 <= k <= 47 for k in kencds):
+        raise argparse.ArgumentTypeError(f"kencd must be within 1-47: {spec!r}")
+    return kencds
+
+
+def list_page_urls(max_pages: int = MAX_PAGES, kencds: Optional[Sequence[int]] = None) -> List[Tuple[str, int]]:
     list_urls: List[Tuple[str, int]] = []
 
-    for kencd in range(1, 48):
+    for kencd in kencds or range(1, 48):
         list_urls.append((f"{START_URL}?kencd={kencd}", kencd))
 
+    return list_urls[:max_pages] if max_pages else list_urls
+
+
+def enough_candidates(frontier: Frontier, max_resorts: int) -> bool:
+    return bool(max_resorts) and frontier.count("resort") >= max_resorts * 2
+
+
+def pending_resort_urls(frontier: Frontier) -> List[Tuple[str, Optional[int]]]:
+    """Pending resort URLs; entries a resumed pre-classifier journal queued for non-resort pages are rejected."""
+    todo = []
+    for url, kencd in frontier.pending("resort"):
+        if looks_like_resort_url(url):
+            todo.append((url, kencd))
+        else:
+            record_reject(frontier, url, "not a resort page")
+    return todo
+
+
+def report_pruned(pruned: Set[str], frontier: Frontier) -> None:
+    # links to list pages the crawl fetches anyway don't count as avoided
+    avoided = sum(1 for u in pruned if not frontier.known(u))
+    print(f"  Collected {frontier.count('resort')} candidate URLs "
+          f"({avoided} non-resort links skipped = fetches avoided)")
 
 
-    for i, (list_url, kencd) in enumerate(list_urls[:MAX_PAGES], start=1):
+def crawl(cache: Optional[HttpCache] = None, frontier: Optional[Frontier] = None,
+          max_pages: int = MAX_PAGES, max_resorts: int = MAX_RESORTS,
+          on_resort: Optional[Callable[[Resort], None]] = None,
+          limiter: Optional[HostLimiter] = None,
+          fingerprints: Optional[FingerprintStore] = None,
+          kencds: Optional[Sequence[int]] = None) -> ResortTable:
+    ensure_dirs()
+    frontier = frontier or Frontier()
+    limiter = limiter or HostLimiter(DEFAULT_RATE)
+    session = requests.Session()
+    limiter.bucket(BASE_URL).acquire()
+    warm_up(session)
+    print("[1/3] Collecting resort links from list pages...")
+    for list_url, kencd in list_page_urls(max_pages, kencds):
+        frontier.add(list_url, kencd, "list")
+
+    list_urls = frontier.pending("list")
+    if enough_candidates(frontier, max_resorts):
+        list_urls = []
+    pruned: Set[str] = set()
+
+    for i, (list_url, kencd) in enumerate(list_urls, start=1):
         try:
-            print(f"  - Fetch list page ({i}/{min(MAX_PAGES, len(list_urls))}): {list_url}")
-            html = fetch_html(list_url, session)
-            links = extract_resort_links_from_list(html)
+            print(f"  - Fetch list page ({i}/{len(list_urls)}): {list_url}")
+            html = fetch_with_retry(list_url, session, cache, limiter)
+            links = extract_resort_links_from_list(html, pruned)
             for u in links:
-                if u not in seen:
-                    seen.add(u)
-                    resort_urls.append((u, kencd))
-
-            time.sleep(SLEEP_SEC)
+                frontier.add(u, kencd, "resort")
+            frontier.mark_done(list_url)
         except requests.RequestException as e:
+            frontier.mark_failed(list_url, str(e))
             print(f"    ! Failed to fetch list page: {e}")
 
-        if len(resort_urls) >= MAX_RESORTS * 2:
+        if enough_candidates(frontier, max_resorts):
             break
 
-    print(f"  Collected {len(resort_urls)} candidate URLs")
+    report_pruned(pruned, frontier)
 
     print("[2/3] Crawling resort pages and extracting difficulty percentages...")
-    resorts: List[Resort] = []
+    resorts = ResortTable.from_records(frontier.results())
+    if len(resorts):
+        print(f"  Resuming with {len(resorts)} resorts already in the journal")
+    resort_urls = pending_resort_urls(frontier)
 
     for idx, (url, kencd) in enumerate(resort_urls, start=1):
-        if len(resorts) >= MAX_RESORTS:
+        if max_resorts and len(resorts) >= max_resorts:
             break
 
         try:
             print(f"  - ({idx}/{len(resort_urls)}) {url}")
-            html = fetch_html(url, session)
-            resort = parse_resort_page(url, html, kencd)
-
-            if is_valid_resort(resort):
+            html = fetch_with_retry(url, session, cache, limiter)
+            resort, reason = parse_checked(url, html, kencd, fingerprints)
+
+            if reason is None:
+                METRICS.inc("crawl_resorts_total", result="valid")
+                if on_resort:
+                    on_resort(resort)
+                frontier.mark_done(url, asdict(resort))
                 resorts.append(resort)
                 print(f"    OK: {resort.name} | 初級{resort.beginner_pct}% 中級{resort.intermediate_pct}% 上級{resort.advanced_pct}%")
             else:
-                pass
-
-            time.sleep(SLEEP_SEC)
+                record_reject(frontier, url, reason)
 
         except requests.RequestException as e:
+            frontier.mark_failed(url, str(e))
             print(f"    ! Failed: {e}")
 
     print(f"  Extracted {len(resorts)} resorts with valid difficulty data")
-    return resorts
+    return resorts.head(max_resorts) if max_resorts else resorts
 
 
-def save_csv(resorts: List[Resort], path: str) -> None:
+def save_csv(resorts: Iterable[Resort], path: str) -> None:
     ensure_dirs()
     fields = ["name", "prefecture", "url", "kencd",
           "beginner_pct", "intermediate_pct", "advanced_pct", "fetched_at"]
-    with open(path, "w", newline="", encoding="utf-8") as f:
+    with METRICS.time("crawl_stage_seconds", stage="save_csv"), \
+            open(path, "w", newline="", encoding="utf-8") as f:
         w = csv.DictWriter(f, fieldnames=fields)
         w.writeheader()
         for r in resorts:
@@ -248,7 +470,7 @@ def save_csv(resorts: List[Resort], path: str) -> None:
     print(f"[3/3] Saved CSV -> {path}")
 
 
-def make_plots(resorts: List[Resort]) -> None:
+def make_plots(resorts: ResortTable) -> None:
     try:
         import matplotlib.pyplot as plt
     except ImportError:
@@ -257,7 +479,7 @@ def make_plots(resorts: List[Resort]) -> None:
 
     ensure_dirs()
 
-    beginner = [r.beginner_pct for r in resorts if r.beginner_pct is not None]
+    beginner = resorts.values("beginner_pct")
     if not beginner:
         print("No data for plotting.")
         return
@@ -272,14 +494,10 @@ def make_plots(resorts: List[Resort]) -> None:
     plt.close()
     print(f"Saved plot -> {hist_path}")
 
-    sorted_resorts = sorted(
-        [r for r in resorts if r.beginner_pct is not None],
-        key=lambda x: x.beginner_pct,
-        reverse=True
-    )[:10]
+    top10 = resorts.take(resorts.top_k("beginner_pct", 10))
 
     plt.figure()
-    plt.bar([r.name for r in sorted_resorts], [r.beginner_pct for r in sorted_resorts])
+    plt.bar(top10.column("name"), top10.column("beginner_pct"))
     plt.title("Top 10 Resorts by Beginner %")
     plt.xlabel("Resort")
     plt.ylabel("Beginner %")
@@ -290,12 +508,101 @@ def make_plots(resorts: List[Resort]) -> None:
     print(f"Saved plot -> {top10_path}")
 
 
-def main() -> None:
-    resorts = crawl()
-    save_csv(resorts, CSV_PATH)
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="surfsnow ski resort crawler")
+    p.add_argument("--engine", choices=("seq", "async", "pipeline"), default="seq",
+                   help="seq: one request at a time / async: concurrent crawl / "
+                        "pipeline: fetch threads feeding a process pool of parsers")
+    p.add_argument("--concurrency", type=int, default=4,
+                   help="max requests in flight (async and pipeline engines)")
+    p.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                   help="starting requests per second per host (default matches SLEEP_SEC)")
+    p.add_argument("--max-rate", type=float, default=None,
+                   help="ceiling the rate may grow to while the host answers fast (default: --rate, "
+                        "a fixed pace that only slows down on throttling; set it higher to ramp up)")
+    p.add_argument("--burst", type=int, default=1,
+                   help="token bucket size per host")
+    p.add_argument("--retries", type=int, default=3,
+                   help="retries for timeouts, connection errors and 429/5xx answers")
+    p.add_argument("--parse-workers", type=int, default=None,
+                   help="parser processes (pipeline engine, default: CPUs - 1)")
+    p.add_argument("--queue-size", type=int, default=32,
+                   help="bound of the fetch->parse and parse->write queues (pipeline engine)")
+    p.add_argument("--no-cache", action="store_true",
+                   help=f"always download full pages instead of revalidating against {CACHE_PATH}")
+    p.add_argument("--cache-ttl", type=float, default=14.0,
+                   help="days to keep cached responses")
+    p.add_argument("--resume", action="store_true",
+                   help=f"continue the crawl journaled in {JOURNAL_PATH} instead of starting over")
+    p.add_argument("--max-pages", type=int, default=MAX_PAGES,
+                   help="list pages (prefectures) to crawl, 0 = all 47")
+    p.add_argument("--kencd", type=parse_kencds, default=None, metavar="SPEC",
+                   help='only these prefecture codes, e.g. "1-12,15" (used by shard.py)')
+    p.add_argument("--max-resorts", type=int, default=MAX_RESORTS,
+                   help="stop after this many valid resorts, 0 = no limit")
+    p.add_argument("--reparse", action="store_true",
+                   help="parse every page even if its content fingerprint matches the last crawl")
+    p.add_argument("--no-report", action="store_true",
+                   help="skip the Parquet export, plots and summary (shard processes)")
+    p.add_argument("--metrics", action="store_true",
+                   help="print per-stage latency percentiles at the end of the run")
+    return p.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    ensure_dirs()
+    cache = None if args.no_cache else HttpCache(CACHE_PATH, ttl_sec=args.cache_ttl * 24 * 3600)
+    frontier = Frontier(JOURNAL_PATH, resume=args.resume)
+    sink = ResortSink(CSV_PATH, DB_PATH, append=args.resume)
+    if args.resume:
+        restored = sink.restore(frontier.results())
+        if restored:
+            print(f"  Restored {restored} journaled resorts missing from {DB_PATH}")
+    fingerprints = None if args.reparse else FingerprintStore(DB_PATH)
+    limiter = HostLimiter(args.rate, args.burst, max_rate=args.max_rate, retry=RetryPolicy(args.retries))
+    started = time.perf_counter()
+    try:
+        if args.engine == "async":
+            from crawl_async import crawl_async
+            resorts = crawl_async(args.concurrency, args.rate, args.burst, cache,
+                                  frontier, args.max_pages, args.max_resorts, sink.write, limiter, fingerprints, args.kencd)
+        elif args.engine == "pipeline":
+            from pipeline import crawl_pipeline
+            resorts = crawl_pipeline(args.concurrency, args.parse_workers, args.queue_size,
+                                     args.rate, args.burst, cache, frontier,
+                                     args.max_pages, args.max_resorts, sink.write, limiter, fingerprints, args.kencd)
+        else:
+            resorts = crawl(cache, frontier, args.max_pages, args.max_resorts, sink.write, limiter,
+                            fingerprints, args.kencd)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted. Progress is saved in {JOURNAL_PATH}; rerun with --resume to continue.")
+        raise SystemExit(130)
+    finally:
+        sink.close()
+        if fingerprints:
+            print(f"  {fingerprints.summary()}")
+            fingerprints.close()
+        print(f"  journal: {frontier.summary()}")
+        print(f"  politeness: {limiter.summary()}")
+        frontier.close()
+        if cache:
+            print(f"  {cache.summary()}")
+            cache.close()
+        elapsed = time.perf_counter() - started
+        METRICS.set("crawl_run_seconds", elapsed, engine=args.engine)
+        METRICS.write(METRICS_JSON_PATH, METRICS_PROM_PATH, engine=args.engine,
+                      argv=sys.argv[1:] if argv is None else list(argv))
+        if args.metrics:
+            for line in METRICS.summary():
+                print(f"  {line}")
+    print(f"  Crawl time ({args.engine}): {elapsed:.1f}s")
+    if args.no_report:
+        return
+    export_if_available(DB_PATH, PARQUET_PATH)
     make_plots(resorts)
-    if resorts:
-        b = [r.beginner_pct for r in resorts if r.beginner_pct is not None]
+    if len(resorts):
+        b = resorts.values("beginner_pct")
         avg = sum(b) / len(b) if b else 0.0
         print(f"\nSummary:")
         print(f"- Resorts: {len(resorts)}")
@@ -303,4 +610,6 @@ def main() -> None:
 
 
 if __name__ == "__main__":
+    # crawl_async etc. do "from main import ..."; share this module instead of importing a second copy
+    sys.modules.setdefault("main", sys.modules[__name__])
     main()
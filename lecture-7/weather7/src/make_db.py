@@ -1,26 +1,61 @@
-import sqlite3
-import pandas as pd
+import csv
+import time
 from pathlib import Path
 
+import resort_db
+from columnar import export_if_available
+
 SRC_DIR = Path(__file__).resolve().parent
 
 CSV_PATH = SRC_DIR / "output" / "ski_resorts.csv"
 DB_PATH  = SRC_DIR / "output" / "ski.db"
+PARQUET_PATH = SRC_DIR / "output" / "ski_resorts.parquet"
+
+TABLE_NAME = resort_db.TABLE_NAME
+CHUNK_ROWS = 5000
+
+INT_COLUMNS = ("kencd", "beginner_pct", "intermediate_pct", "advanced_pct")
+
+
+def to_row(rec: dict) -> dict:
+    row = {c: (rec.get(c) or None) for c in resort_db.COLUMNS}
+    for c in INT_COLUMNS:
+        if row[c] is not None:
+            row[c] = int(float(row[c]))
+    return row
+
+
+def read_chunks(path: Path, size: int = CHUNK_ROWS):
+    with open(path, newline="", encoding="utf-8") as f:
+        chunk = []
+        for rec in csv.DictReader(f):
+            if not rec.get("url"):
+                continue
+            chunk.append(to_row(rec))
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
 
-TABLE_NAME = "ski_resorts"
 
 def main():
     print("CSV_PATH =", CSV_PATH)
     print("DB_PATH  =", DB_PATH)
 
-    df = pd.read_csv(CSV_PATH)
-
-    conn = sqlite3.connect(DB_PATH)
-    df.to_sql(TABLE_NAME, conn, if_exists="replace", index=False)
+    started = time.perf_counter()
+    conn = resort_db.connect(DB_PATH)
+    total = changed = 0
+    # one transaction per chunk: readers in WAL mode see each committed chunk
+    for chunk in read_chunks(CSV_PATH):
+        changed += resort_db.upsert(conn, chunk)
+        total += len(chunk)
+    n = conn.execute(f"SELECT COUNT(*) FROM {TABLE_NAME}").fetchone()[0]
     conn.close()
 
-    print(f"DB作成完了: {DB_PATH} / 行数: {len(df)}")
+    print(f"DB更新完了: {DB_PATH} / 読込: {total} / 追加・更新: {changed} / 行数: {n} "
+          f"({time.perf_counter() - started:.2f}s)")
+    export_if_available(DB_PATH, PARQUET_PATH)
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,212 @@
+"""Counters, gauges and latency histograms for a crawl run.
+
+fetch_html, the parsers, the politeness sleeps and the writers record into
+the process-wide METRICS registry; main() writes it out at the end of a run
+as JSON (output/metrics.json) and Prometheus text format (output/metrics.prom).
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# seconds; le="+Inf" is implied
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+
+HELP = {
+    "crawl_fetch_seconds": "fetch_html wall time per request, cache revalidation included",
+    "crawl_stage_seconds": "time spent per stage: connect_wait (connect + server wait until headers), "
+                           "download, decode, parse, write, save_csv, sleep",
+    "crawl_http_responses_total": "HTTP responses by status code",
+    "crawl_http_response_bytes_total": "response body bytes received",
+    "crawl_fetch_errors_total": "requests that failed without a response, by exception type",
+    "crawl_resorts_total": "parsed resort pages by outcome",
+    "crawl_rejects_total": "resort pages rejected by validation, by reason",
+    "crawl_run_seconds": "wall time of the last crawl run",
+    "crawl_retries_total": "requests retried after a transient failure, by HTTP status or exception type",
+    "crawl_circuit_open_total": "times a host's circuit breaker opened and paused its requests",
+    "crawl_rate": "current AIMD request rate per host, requests per second",
+    "crawl_fingerprint_total": "resort pages checked against stored content fingerprints: new, changed, unchanged",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf"
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, v)] += 1
+        self.sum += v
+        self.count += 1
+        self.max = max(self.max, v)
+
+    def quantile(self, q: float) -> float:
+        """Estimate from the buckets, interpolating linearly inside the one that holds q."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, n in zip(self.bounds + (self.max,), self.counts):
+            if n and seen + n >= rank:
+                upper = min(bound, self.max)
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+            lower = bound
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        cumulative = 0
+        buckets = {}
+        for bound, n in zip(self.bounds + (math.inf,), self.counts):
+            cumulative += n
+            buckets[_fmt_value(bound)] = cumulative
+        return {
+            "count": self.count, "sum": round(self.sum, 6), "max": round(self.max, 6),
+            "p50": round(self.quantile(0.5), 6), "p95": round(self.quantile(0.95), 6),
+            "p99": round(self.quantile(0.99), 6), "buckets": buckets,
+        }
+
+
+class Metrics:
+    """Thread-safe registry. Metric names follow Prometheus conventions
+    (counters end in _total, durations are in seconds)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counters: Dict[str, Dict[Labels, float]] = {}
+            self.gauges: Dict[str, Dict[Labels, float]] = {}
+            self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = _labels(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: Any) -> None:
+        with self.lock:
+            self.gauges.setdefault(name, {})[_labels(labels)] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = _labels(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels: Any) -> Iterator[None]:
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t, **labels)
+
+    def counter(self, name: str, **labels: Any) -> float:
+        with self.lock:
+            return self.counters.get(name, {}).get(_labels(labels), 0.0)
+
+    def histogram(self, name: str, **labels: Any) -> Optional[Histogram]:
+        with self.lock:
+            return self.histograms.get(name, {}).get(_labels(labels))
+
+    def report(self, **info: Any) -> Dict[str, Any]:
+        def series(d: Dict[Labels, Any], conv) -> List[Dict[str, Any]]:
+            return [{"labels": dict(k), **conv(v)} for k, v in sorted(d.items())]
+
+        with self.lock:
+            return {
+                "info": info,
+                "counters": {n: series(s, lambda v: {"value": v}) for n, s in sorted(self.counters.items())},
+                "gauges": {n: series(s, lambda v: {"value": v}) for n, s in sorted(self.gauges.items())},
+                "histograms": {n: series(s, Histogram.to_dict) for n, s in sorted(self.histograms.items())},
+            }
+
+    def prometheus(self) -> str:
+        lines: List[str] = []
+
+        def header(name: str, kind: str) -> None:
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self.lock:
+            for kind, metrics in (("counter", self.counters), ("gauge", self.gauges)):
+                for name, series in sorted(metrics.items()):
+                    header(name, kind)
+                    for labels, v in sorted(series.items()):
+                        lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(v)}")
+            for name, series in sorted(self.histograms.items()):
+                header(name, "histogram")
+                for labels, h in sorted(series.items()):
+                    cumulative = 0
+                    for bound, n in zip(h.bounds + (math.inf,), h.counts):
+                        cumulative += n
+                        lines.append(f"{name}_bucket{_fmt_labels(labels, ('le', _fmt_value(bound)))} {cumulative}")
+                    lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_value(h.sum)}")
+                    lines.append(f"{name}_count{_fmt_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> List[str]:
+        """One line per histogram series: count, total, p50/p95/max."""
+        out = []
+        with self.lock:
+            for name, series in sorted(self.histograms.items()):
+                for labels, h in sorted(series.items()):
+                    tag = ",".join(v for _, v in labels)
+                    out.append(f"{name.replace('crawl_', '')}[{tag}]: n={h.count} total={h.sum:.2f}s "
+                               f"p50={h.quantile(0.5) * 1000:.1f}ms p95={h.quantile(0.95) * 1000:.1f}ms "
+                               f"max={h.max * 1000:.1f}ms")
+        return out
+
+    def write(self, json_path: str, prom_path: str, **info: Any) -> None:
+        for path in (json_path, prom_path):
+            d = os.path.dirname(path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(self.report(**info), f, ensure_ascii=False, indent=2)
+        with open(prom_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        print(f"Saved metrics -> {json_path}, {prom_path}")
+
+
+METRICS = Metrics()
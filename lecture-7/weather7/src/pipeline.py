@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Callable, List, Optional, Sequence, Set, Tuple
+
+import requests
+
+from fingerprints import FingerprintStore, fingerprint
+from frontier import Frontier
+from http_cache import HttpCache
+from metrics import METRICS
+from politeness import HostLimiter
+from main import (
+    BASE_URL,
+    MAX_PAGES,
+    MAX_RESORTS,
+    Resort,
+    ResortTable,
+    enough_candidates,
+    ensure_dirs,
+    extract_resort_links_from_list,
+    fetch_with_retry,
+    list_page_urls,
+    pending_resort_urls,
+    parse_resort_page,
+    record_reject,
+    reject_reason,
+    report_pruned,
+    reused_outcome,
+    warm_up,
+)
+
+
+_DONE = object()
+
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.started = time.perf_counter()
+        self.finished = self.started
+        self.lock = threading.Lock()
+
+    def add(self, busy: float) -> None:
+        with self.lock:
+            self.items += 1
+            self.busy += busy
+            self.finished = time.perf_counter()
+
+    def report(self) -> str:
+        wall = max(self.finished - self.started, 1e-9)
+        return (f"{self.name:<6} {self.items:5d} items  {self.items / wall:7.2f}/s  "
+                f"busy {self.busy:6.1f}s")
+
+
+def parse_and_validate(url: str, html: str, kencd: Optional[int]) -> Tuple[Resort, Optional[str], float]:
+    """Runs in a worker process. Returns the resort, its reject reason and the parse time,
+    which the parent records since the worker's METRICS never reach the report."""
+    t = time.perf_counter()
+    resort = parse_resort_page(url, html, kencd)
+    return resort, reject_reason(resort), time.perf_counter() - t
+
+
+class Pipeline:
+    """fetch threads -> bounded queue -> parse processes -> bounded queue -> writer.
+
+    Fetching is I/O bound and runs in threads with one session each; parsing
+    is CPU bound and runs in a ProcessPoolExecutor; the writer (the calling
+    thread) journals results and hands them on. Both queues are bounded, so a
+    slow stage applies back-pressure instead of buffering the whole crawl.
+    Setting self.stop (enough resorts, a stage error, Ctrl-C) unblocks every
+    stage; a stage's exception is re-raised by crawl_resorts.
+    """
+
+    def __init__(self, fetch_workers: int = 4, parse_workers: Optional[int] = None,
+                 queue_size: int = 32, rate: float = 1.0, burst: int = 1,
+                 cache: Optional[HttpCache] = None, limiter: Optional[HostLimiter] = None,
+                 fingerprints: Optional[FingerprintStore] = None):
+        self.fingerprints = fingerprints
+        self.fetch_workers = max(1, fetch_workers)
+        self.parse_workers = parse_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.queue_size = queue_size
+        self.limiter = limiter or HostLimiter(rate, burst)
+        self.cache = cache
+        self.local = threading.local()
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self.stop = threading.Event()
+        self.stats = {name: StageStats(name) for name in ("fetch", "parse", "write")}
+
+    def session(self) -> requests.Session:
+        s = getattr(self.local, "session", None)
+        if s is None:
+            s = requests.Session()
+            s.cookies.update(self.cookies)
+            self.local.session = s
+        return s
+
+    def fetch(self, url: str) -> str:
+        t = time.perf_counter()
+        html = fetch_with_retry(url, self.session(), self.cache, self.limiter)
+        self.stats["fetch"].add(time.perf_counter() - t)
+        return html
+
+    def put(self, q: queue.Queue, item) -> bool:
+        """q.put() that gives up once the pipeline is stopping."""
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(self, q: queue.Queue):
+        """q.get(), or _DONE once the pipeline is stopping and q is empty."""
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self.stop.is_set():
+                    return _DONE
+
+    def warm_up(self) -> None:
+        session = requests.Session()
+        self.limiter.bucket(BASE_URL).acquire()
+        warm_up(session)
+        self.cookies.update(session.cookies)
+
+    def collect_links(self, frontier: Frontier, max_pages: int, max_resorts: int,
+                      kencds: Optional[Sequence[int]] = None) -> None:
+        print("[1/3] Collecting resort links from list pages...")
+        for list_url, kencd in list_page_urls(max_pages, kencds):
+            frontier.add(list_url, kencd, "list")
+        list_urls = [] if enough_candidates(frontier, max_resorts) else frontier.pending("list")
+        pruned: Set[str] = set()
+
+        def one(list_url: str) -> Optional[List[str]]:
+            try:
+                return extract_resort_links_from_list(self.fetch(list_url), pruned)
+            except requests.RequestException as e:
+                frontier.mark_failed(list_url, str(e))
+                print(f"    ! Failed to fetch list page: {list_url}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as pool:
+            results = list(pool.map(one, [u for u, _ in list_urls]))
+
+        for (list_url, kencd), links in zip(list_urls, results):
+            if links is None:
+                continue
+            for u in links:
+                frontier.add(u, kencd, "resort")
+            frontier.mark_done(list_url)
+            if enough_candidates(frontier, max_resorts):
+                break
+        report_pruned(pruned, frontier)
+
+    def crawl_resorts(self, frontier: Frontier, max_resorts: int,
+                      on_resort: Optional[Callable[[Resort], None]] = None) -> ResortTable:
+        print("[2/3] Crawling resort pages and extracting difficulty percentages...")
+        done = ResortTable.from_records(frontier.results())
+        if len(done):
+            print(f"  Resuming with {len(done)} resorts already in the journal")
+        todo = pending_resort_urls(frontier)
+        todo_q: queue.Queue = queue.Queue()
+        for idx, (url, kencd) in enumerate(todo, start=1):
+            todo_q.put((idx, url, kencd))
+
+        html_q: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        parsed_q: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        found: List[Tuple[int, Resort]] = []
+        errors: List[BaseException] = []
+
+        def enough() -> bool:
+            return bool(max_resorts) and len(done) + len(found) >= max_resorts
+
+        def stage(fn: Callable[..., None]) -> Callable[..., None]:
+            # a failing stage stops the others; the writer re-raises its error
+            def run(*args) -> None:
+                try:
+                    fn(*args)
+                except BaseException as e:
+                    errors.append(e)
+                    self.stop.set()
+            return run
+
+        def fetcher() -> None:
+            while not self.stop.is_set():
+                try:
+                    idx, url, kencd = todo_q.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    html = self.fetch(url)
+                except requests.RequestException as e:
+                    frontier.mark_failed(url, str(e))
+                    print(f"  - ({idx}/{len(todo)}) {url}\n    ! Failed: {e}")
+                    continue
+                self.put(html_q, (idx, url, kencd, html))
+
+        def parser(procs: ProcessPoolExecutor) -> None:
+            # at most queue_size parses in flight keeps parsed_q the only buffer;
+            # a slot is released only after its result is queued for the writer
+            slots = threading.BoundedSemaphore(self.queue_size)
+            while True:
+                item = self.get(html_q)
+                if item is _DONE:
+                    break
+                idx, url, kencd, html = item
+                digest = None
+                if self.fingerprints:
+                    # unchanged pages never go to a worker process
+                    digest = fingerprint(html)
+                    hit = self.fingerprints.lookup(url, digest)
+                    if hit:
+                        done_fut: Future = Future()
+                        done_fut.set_result((*reused_outcome(url, kencd, hit), None))
+                        self.put(parsed_q, (idx, url, None, done_fut))
+                        continue
+                slots.acquire()
+                t = time.perf_counter()
+                try:
+                    fut = procs.submit(parse_and_validate, url, html, kencd)
+                except RuntimeError:
+                    slots.release()  # the pool was shut down: the pipeline is stopping
+                    break
+
+                def forward(f, idx=idx, url=url, t=t, digest=digest):
+                    try:
+                        self.stats["parse"].add(time.perf_counter() - t)
+                        self.put(parsed_q, (idx, url, digest, f))
+                    finally:
+                        slots.release()
+
+                fut.add_done_callback(forward)
+            for _ in range(self.queue_size):
+                slots.acquire()
+
+        fetchers = [threading.Thread(target=stage(fetcher), name=f"fetch-{i}", daemon=True)
+                    for i in range(self.fetch_workers)]
+        procs = ProcessPoolExecutor(max_workers=self.parse_workers)
+        parse_thread = threading.Thread(target=stage(parser), args=(procs,), name="parse", daemon=True)
+
+        def close_parse() -> None:
+            for th in fetchers:
+                th.join()
+            self.put(html_q, _DONE)
+            parse_thread.join()
+            self.put(parsed_q, _DONE)
+
+        for th in fetchers:
+            th.start()
+        parse_thread.start()
+        closer = threading.Thread(target=stage(close_parse), name="close", daemon=True)
+        closer.start()
+
+        try:
+            while True:
+                item = self.get(parsed_q)
+                if item is _DONE:
+                    break
+                idx, url, digest, fut = item
+                t = time.perf_counter()
+                try:
+                    resort, reason, parse_sec = fut.result()
+                except Exception as e:
+                    frontier.mark_failed(url, f"parse error: {e}")
+                    print(f"  - ({idx}/{len(todo)}) {url}\n    ! Parse failed: {e}")
+                    continue
+                print(f"  - ({idx}/{len(todo)}) {url}")
+                if parse_sec is not None:
+                    METRICS.observe("crawl_stage_seconds", parse_sec, stage="parse")
+                if digest is not None:
+                    self.fingerprints.record(url, digest, reason)
+                if reason is None:
+                    METRICS.inc("crawl_resorts_total", result="valid")
+                    if on_resort:
+                        on_resort(resort)
+                    frontier.mark_done(url, asdict(resort))
+                    found.append((idx, resort))
+                    print(f"    OK: {resort.name} | 初級{resort.beginner_pct}% 中級{resort.intermediate_pct}% 上級{resort.advanced_pct}%")
+                else:
+                    record_reject(frontier, url, reason)
+                self.stats["write"].add(time.perf_counter() - t)
+                if enough():
+                    break  # results still queued or in flight stay pending in the journal
+        finally:
+            # whether done, failed or interrupted: nothing may stay blocked on a full queue
+            # or wait for parses nobody will write
+            self.stop.set()
+            procs.shutdown(wait=True, cancel_futures=True)
+        closer.join()
+        if errors:
+            raise errors[0]
+
+        found.sort(key=lambda x: x[0])
+        resorts = done
+        resorts.extend(r for _, r in found)
+        if max_resorts:
+            resorts = resorts.head(max_resorts)
+        print(f"  Extracted {len(resorts)} resorts with valid difficulty data")
+        for s in self.stats.values():
+            print(f"  {s.report()}")
+        return resorts
+
+
+def crawl_pipeline(fetch_workers: int = 4, parse_workers: Optional[int] = None, queue_size: int = 32,
+                   rate: float = 1.0, burst: int = 1, cache: Optional[HttpCache] = None,
+                   frontier: Optional[Frontier] = None, max_pages: int = MAX_PAGES,
+                   max_resorts: int = MAX_RESORTS,
+                   on_resort: Optional[Callable[[Resort], None]] = None,
+                   limiter: Optional[HostLimiter] = None,
+                   fingerprints: Optional[FingerprintStore] = None,
+                   kencds: Optional[Sequence[int]] = None) -> ResortTable:
+    ensure_dirs()
+    frontier = frontier or Frontier()
+    p = Pipeline(fetch_workers, parse_workers, queue_size, rate, burst, cache, limiter, fingerprints)
+    p.warm_up()
+    p.collect_links(frontier, max_pages, max_resorts, kencds)
+    return p.crawl_resorts(frontier, max_resorts, on_resort)
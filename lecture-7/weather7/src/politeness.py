@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from metrics import METRICS
+
+# answers worth retrying; 429/503 also mean "slow down"
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+THROTTLE_STATUS = {429, 503}
+MAX_RETRY_AFTER = 300.0
+
+
+class CircuitOpenError(requests.RequestException):
+    """The host failed too often; requests fail fast until the breaker cools down."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket. reserve() returns how long the caller must wait."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.hold_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            delay = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(delay, self.hold_until - now)
+
+    def set_rate(self, rate: float) -> None:
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def hold(self, seconds: float) -> None:
+        """No token is handed out for the next seconds (Retry-After)."""
+        with self.lock:
+            self.hold_until = max(self.hold_until, time.monotonic() + seconds)
+
+    def acquire(self) -> None:
+        delay = self.reserve()
+        METRICS.observe("crawl_stage_seconds", max(delay, 0.0), stage="sleep")
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        delay = self.reserve()
+        METRICS.observe("crawl_stage_seconds", max(delay, 0.0), stage="sleep")
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AimdController:
+    """Additive-increase / multiplicative-decrease on a bucket's rate.
+
+    Every success adds `increase` req/s up to max_rate. A 429/503, or a
+    latency EWMA above slow_sec, multiplies the rate by `decrease` (at most
+    once per current request interval, so one burst of errors is one cut).
+    """
+
+    def __init__(self, bucket: TokenBucket, host: str, min_rate: float, max_rate: float,
+                 increase: float = 0.05, decrease: float = 0.5, slow_sec: float = 5.0):
+        self.bucket = bucket
+        self.host = host
+        self.min_rate = min(min_rate, bucket.rate)
+        self.max_rate = max(max_rate, bucket.rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_sec = slow_sec
+        self.latency: Optional[float] = None
+        self.last_cut = 0.0
+        self.lock = threading.Lock()
+
+    def _set(self, rate: float) -> None:
+        self.bucket.set_rate(rate)
+        METRICS.set("crawl_rate", rate, host=self.host)
+
+    def on_success(self, latency: float) -> None:
+        with self.lock:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            if self.latency > self.slow_sec:
+                self._cut()
+            elif self.bucket.rate < self.max_rate:
+                self._set(min(self.max_rate, self.bucket.rate + self.increase))
+
+    def on_throttle(self) -> None:
+        with self.lock:
+            self._cut()
+
+    def _cut(self) -> None:
+        now = time.monotonic()
+        if now - self.last_cut < 1 / self.bucket.rate:
+            return
+        self.last_cut = now
+        self._set(max(self.min_rate, self.bucket.rate * self.decrease))
+
+
+class CircuitBreaker:
+    """closed -> open after `threshold` consecutive failures; after `cooldown`
+    one probe request is let through (half-open). A successful probe closes
+    the breaker, a failed one reopens it with twice the cooldown."""
+
+    def __init__(self, host: str, threshold: int = 5, cooldown: float = 60.0, max_cooldown: float = 600.0):
+        self.host = host
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def check(self) -> None:
+        with self.lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"  # this caller is the probe
+                return
+            left = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+            raise CircuitOpenError(f"circuit open for {self.host} ({left:.0f}s left)")
+
+    def on_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.state = "closed"
+            self.cooldown = self.base_cooldown
+
+    def on_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.state == "half_open":
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            elif self.failures < self.threshold:
+                return
+            if self.state != "open":
+                METRICS.inc("crawl_circuit_open_total", host=self.host)
+                print(f"    ! {self.host} keeps failing; pausing requests for {self.cooldown:.0f}s")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class HostPolicy:
+    def __init__(self, host: str, rate: float, burst: int, max_rate: float, min_rate: float):
+        self.bucket = TokenBucket(rate, burst)
+        self.aimd = AimdController(self.bucket, host, min_rate, max_rate)
+        self.breaker = CircuitBreaker(host)
+
+
+class HostLimiter:
+    """One token bucket, rate controller and circuit breaker per host, so
+    politeness is enforced per site, not globally, plus the retry policy
+    fetch_with_retry uses. With max_rate=rate (the default) the rate only
+    drops on throttling and recovers up to rate."""
+
+    def __init__(self, rate: float, burst: int = 1, max_rate: Optional[float] = None,
+                 min_rate: Optional[float] = None, retry: Optional["RetryPolicy"] = None):
+        self.rate = rate
+        self.burst = burst
+        self.max_rate = rate if max_rate is None else max_rate
+        self.min_rate = rate / 10 if min_rate is None else min_rate
+        self.retry = retry or RetryPolicy()
+        self.policies: Dict[str, HostPolicy] = {}
+        self.lock = threading.Lock()
+
+    def policy(self, url: str) -> HostPolicy:
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.policies:
+                self.policies[host] = HostPolicy(host, self.rate, self.burst, self.max_rate, self.min_rate)
+            return self.policies[host]
+
+    def bucket(self, url: str) -> TokenBucket:
+        return self.policy(url).bucket
+
+    async def wait(self, url: str) -> None:
+        await self.bucket(url).acquire_async()
+
+    def summary(self) -> str:
+        with self.lock:
+            return ", ".join(f"{h}: {p.bucket.rate:.2f} req/s, circuit {p.breaker.state}"
+                             for h, p in self.policies.items()) or "no requests"
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter: attempt n waits uniform(0, min(cap, base * 2**n))."""
+
+    def __init__(self, retries: int = 3, base: float = 1.0, cap: float = 30.0):
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+
+def response_status(e: requests.RequestException) -> Optional[int]:
+    resp = getattr(e, "response", None)
+    return resp.status_code if resp is not None else None
+
+
+def is_transient(e: requests.RequestException) -> bool:
+    if isinstance(e, CircuitOpenError):
+        return False
+    status = response_status(e)
+    if status is not None:
+        return status in TRANSIENT_STATUS
+    return isinstance(e, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError))
+
+
+def retry_after(e: requests.RequestException) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP-date), capped at MAX_RETRY_AFTER."""
+    resp = getattr(e, "response", None)
+    value = resp.headers.get("Retry-After") if resp is not None else None
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(MAX_RETRY_AFTER, max(0.0, seconds))
@@ -0,0 +1,182 @@
+"""Local stand-in for surfsnow.jp that replays a recorded crawl.
+
+Pages come from the crawler's HTTP cache (output/http_cache.db after a normal
+run). Absolute links to the recorded origin are rewritten to the replay
+address, so the crawler follows them exactly as it would live.
+
+    python replay_server.py --latency 80 --jitter 40 --error-rate 0.02 --throttle-rate 0.05
+    CRAWL_BASE_URL=http://127.0.0.1:8765 CRAWL_SLEEP_SEC=0 python main.py --no-cache
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+CORPUS_PATH = "output/http_cache.db"
+ORIGIN = "https://surfsnow.jp"
+HOME_PAGE = b"<html><head><title>SURF&amp;SNOW</title></head><body></body></html>"
+
+
+@dataclass
+class Page:
+    body: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+
+@dataclass
+class Faults:
+    latency: float = 0.0        # seconds before each response
+    jitter: float = 0.0         # +- uniform seconds around latency
+    error_rate: float = 0.0     # share of requests answered 500/503
+    throttle_rate: float = 0.0  # share of requests answered 429
+    retry_after: int = 1        # Retry-After seconds sent with 429
+
+
+def load_corpus(path: str = CORPUS_PATH, origin: str = ORIGIN, replay_origin: str = "") -> Dict[str, Page]:
+    """path?query -> Page for every response in the HTTP cache."""
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT url, body, etag, last_modified FROM responses").fetchall()
+    conn.close()
+    origin_re = re.compile(r"(?:https?:)?//" + re.escape(urlparse(origin).netloc))
+    pages = {}
+    for url, body, etag, last_modified in rows:
+        if replay_origin:
+            body = origin_re.sub(replay_origin, body)
+        pages[_key(url)] = Page(body.encode("utf-8"), etag, last_modified)
+    return pages
+
+
+def _key(url: str) -> str:
+    u = urlparse(url)
+    return u.path + (f"?{u.query}" if u.query else "")
+
+
+class ReplayServer:
+    """ThreadingHTTPServer on 127.0.0.1 serving a corpus with injected latency and faults."""
+
+    def __init__(self, corpus: str = CORPUS_PATH, port: int = 0, faults: Optional[Faults] = None,
+                 origin: str = ORIGIN, seed: int = 0):
+        self.faults = faults or Faults()
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats: Dict[int, int] = {}
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.pages = load_corpus(corpus, origin, self.url)
+        self.thread: Optional[threading.Thread] = None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                status, headers, body = server.respond(self.path, self.headers)
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def respond(self, path: str, req_headers) -> tuple:
+        f = self.faults
+        with self.lock:
+            delay = max(0.0, f.latency + self.rng.uniform(-f.jitter, f.jitter))
+            roll = self.rng.random()
+        if delay:
+            time.sleep(delay)
+
+        headers = {"Content-Type": "text/html; charset=utf-8"}
+        body = b""
+        if roll < f.throttle_rate:
+            status = 429
+            headers["Retry-After"] = str(f.retry_after)
+        elif roll < f.throttle_rate + f.error_rate:
+            status = 503 if roll < f.throttle_rate + f.error_rate / 2 else 500
+        else:
+            page = self.pages.get(path)
+            if page is None and path == "/":
+                page = Page(HOME_PAGE, None, None)
+            if page is None:
+                status = 404
+            else:
+                if page.etag:
+                    headers["ETag"] = page.etag
+                if page.last_modified:
+                    headers["Last-Modified"] = page.last_modified
+                if page.etag and req_headers.get("If-None-Match") == page.etag:
+                    status = 304
+                else:
+                    status, body = 200, page.body
+        with self.lock:
+            self.stats[status] = self.stats.get(status, 0) + 1
+        return status, headers, body
+
+    def start(self) -> "ReplayServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="replay", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "ReplayServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def add_fault_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--corpus", default=CORPUS_PATH, help="http_cache.db recorded by a crawl")
+    p.add_argument("--origin", default=ORIGIN, help="origin the corpus was recorded from")
+    p.add_argument("--latency", type=float, default=0.0, help="ms before each response")
+    p.add_argument("--jitter", type=float, default=0.0, help="+- ms of uniform jitter")
+    p.add_argument("--error-rate", type=float, default=0.0, help="share of 500/503 responses")
+    p.add_argument("--throttle-rate", type=float, default=0.0, help="share of 429 responses")
+    p.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on 429")
+    p.add_argument("--seed", type=int, default=0)
+
+
+def faults_from_args(args: argparse.Namespace) -> Faults:
+    return Faults(args.latency / 1000, args.jitter / 1000, args.error_rate,
+                  args.throttle_rate, args.retry_after)
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_fault_args(p)
+    p.add_argument("--port", type=int, default=8765)
+    args = p.parse_args()
+    server = ReplayServer(args.corpus, args.port, faults_from_args(args), args.origin, args.seed)
+    print(f"Replaying {len(server.pages)} pages from {args.corpus} on {server.url}")
+    print(f"  CRAWL_BASE_URL={server.url} python main.py ...")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"  responses: {dict(sorted(server.stats.items()))}")
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
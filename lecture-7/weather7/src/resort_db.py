@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Any, Dict, Iterable, List
+
+TABLE_NAME = "ski_resorts"
+HISTORY_TABLE = f"{TABLE_NAME}_history"
+FINGERPRINT_TABLE = "page_fingerprints"
+
+COLUMNS = ["name", "prefecture", "url", "kencd",
+           "beginner_pct", "intermediate_pct", "advanced_pct", "fetched_at"]
+
+# columns whose change counts as an update; fetched_at alone only adds history
+DATA_COLUMNS = [c for c in COLUMNS if c not in ("url", "fetched_at")]
+
+
+def connect(path, check_same_thread: bool = True) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=check_same_thread)
+    # WAL lets readers (analysis.ipynb, pd.read_sql) keep querying during a load
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    ensure_schema(conn)
+    return conn
+
+
+def _has_url_key(conn: sqlite3.Connection) -> bool:
+    for _, name, _, _, _, pk in conn.execute(f"PRAGMA table_info({TABLE_NAME})"):
+        if name == "url" and pk:
+            return True
+    return False
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """Create ski_resorts keyed on url, its indexes, the fetch history table
+    and the page fingerprints used to skip re-parsing unchanged pages.
+
+    Older ski.db files were written by pandas to_sql without any key; those
+    are migrated in place (one row per url, the last one wins).
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (TABLE_NAME,)
+    ).fetchone()
+    if not (exists and _has_url_key(conn)):
+        _create_main_table(conn, bool(exists))
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {HISTORY_TABLE}(
+      url TEXT NOT NULL,
+      fetched_at TEXT NOT NULL,
+      name TEXT,
+      prefecture TEXT,
+      kencd INTEGER,
+      beginner_pct INTEGER,
+      intermediate_pct INTEGER,
+      advanced_pct INTEGER,
+      PRIMARY KEY(url, fetched_at)
+    )""")
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {FINGERPRINT_TABLE}(
+      url TEXT PRIMARY KEY,
+      content_hash TEXT NOT NULL,
+      reject_reason TEXT,
+      last_seen TEXT NOT NULL
+    )""")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_prefecture ON {TABLE_NAME}(prefecture)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_kencd ON {TABLE_NAME}(kencd)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_beginner ON {TABLE_NAME}(beginner_pct)")
+    conn.commit()
+
+
+def _create_main_table(conn: sqlite3.Connection, legacy: bool) -> None:
+    if legacy:
+        conn.execute(f"ALTER TABLE {TABLE_NAME} RENAME TO {TABLE_NAME}_legacy")
+    conn.execute(f"""
+    CREATE TABLE {TABLE_NAME}(
+      name TEXT,
+      prefecture TEXT,
+      url TEXT PRIMARY KEY,
+      kencd INTEGER,
+      beginner_pct INTEGER,
+      intermediate_pct INTEGER,
+      advanced_pct INTEGER,
+      fetched_at TEXT
+    )""")
+    if legacy:
+        cols = ", ".join(COLUMNS)
+        conn.execute(f"""INSERT OR REPLACE INTO {TABLE_NAME}({cols})
+            SELECT {cols} FROM {TABLE_NAME}_legacy WHERE url IS NOT NULL ORDER BY rowid""")
+        conn.execute(f"DROP TABLE {TABLE_NAME}_legacy")
+
+
+UPSERT_SQL = f"""
+INSERT INTO {TABLE_NAME}({", ".join(COLUMNS)})
+VALUES({", ".join("?" * len(COLUMNS))})
+ON CONFLICT(url) DO UPDATE SET
+  {", ".join(f"{c}=excluded.{c}" for c in COLUMNS if c != "url")}
+WHERE {" OR ".join(f"{c} IS NOT excluded.{c}" for c in DATA_COLUMNS)}
+"""
+
+HISTORY_SQL = f"""
+INSERT OR IGNORE INTO {HISTORY_TABLE}({", ".join(COLUMNS)})
+VALUES({", ".join("?" * len(COLUMNS))})
+"""
+
+
+def upsert(conn: sqlite3.Connection, rows: Iterable[Dict[str, Any]]) -> int:
+    """Insert or update rows (dicts with COLUMNS keys) in one transaction.
+
+    Rows whose data columns are unchanged are left alone; every fetch is
+    still recorded in the history table. Returns the number of rows of
+    ski_resorts that were inserted or updated.
+    """
+    params: List[tuple] = [tuple(r[c] for c in COLUMNS) for r in rows]
+    with conn:
+        before = conn.total_changes
+        conn.executemany(UPSERT_SQL, params)
+        changed = conn.total_changes - before
+        conn.executemany(HISTORY_SQL, params)
+    return changed
@@ -0,0 +1,238 @@
+"""Resort records and a column store for them.
+
+Resort is a slotted dataclass (one row). ResortTable keeps kencd and the
+three percentages in array('h') columns (NULL = -1) and name/prefecture as
+interned strings, so a table costs a few dozen bytes per resort instead of
+a Resort object plus its boxed fields.
+
+    python resort_table.py --rows 200000   # memory and top-k vs List[Resort]
+"""
+from __future__ import annotations
+
+import argparse
+import heapq
+import sys
+import time
+import tracemalloc
+from array import array
+from dataclasses import dataclass, fields, make_dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+
+@dataclass
+class Resort:
+    # explicit __slots__ (no per-instance __dict__); works on every Python 3
+    # version, unlike @dataclass(slots=True)
+    __slots__ = ("name", "prefecture", "url", "kencd",
+                 "beginner_pct", "intermediate_pct", "advanced_pct", "fetched_at")
+    name: str
+    prefecture: Optional[str]
+    url: str
+    kencd: Optional[int]
+    beginner_pct: Optional[int]
+    intermediate_pct: Optional[int]
+    advanced_pct: Optional[int]
+    fetched_at: str
+
+
+NULL = -1
+INT_COLUMNS = ["kencd", "beginner_pct", "intermediate_pct", "advanced_pct"]
+STR_COLUMNS = ["name", "prefecture", "url", "fetched_at"]
+COLUMNS = [f.name for f in fields(Resort)]
+
+
+def _intern(s: Optional[str]) -> Optional[str]:
+    return sys.intern(s) if s is not None else None
+
+
+class ResortTable:
+    def __init__(self):
+        self.cols: Dict[str, Any] = {c: array("h") for c in INT_COLUMNS}
+        self.cols.update({c: [] for c in STR_COLUMNS})
+
+    @classmethod
+    def from_resorts(cls, resorts: Iterable[Resort]) -> "ResortTable":
+        t = cls()
+        t.extend(resorts)
+        return t
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "ResortTable":
+        t = cls()
+        for r in records:
+            t.append(Resort(**r))
+        return t
+
+    def append(self, r: Resort) -> None:
+        c = self.cols
+        # int columns first: they are the ones that raise BufferError while a
+        # to_pandas(copy=False) frame is alive, and then nothing is appended
+        done = []
+        try:
+            for name in INT_COLUMNS:
+                v = getattr(r, name)
+                c[name].append(NULL if v is None else v)
+                done.append(name)
+        except BufferError:
+            for name in done:
+                c[name].pop()
+            raise
+        c["name"].append(_intern(r.name))
+        c["prefecture"].append(_intern(r.prefecture))
+        c["url"].append(r.url)
+        c["fetched_at"].append(r.fetched_at)
+
+    def extend(self, resorts: Iterable[Resort]) -> None:
+        for r in resorts:
+            self.append(r)
+
+    def __len__(self) -> int:
+        return len(self.cols["url"])
+
+    def __getitem__(self, i: int) -> Resort:
+        c = self.cols
+        ints = [c[name][i] for name in INT_COLUMNS]
+        kencd, b, m, a = (None if v == NULL else v for v in ints)
+        return Resort(c["name"][i], c["prefecture"][i], c["url"][i], kencd, b, m, a, c["fetched_at"][i])
+
+    def __iter__(self) -> Iterator[Resort]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def column(self, name: str):
+        """The raw column: array('h') with NULL for missing ints, list for strings."""
+        return self.cols[name]
+
+    def values(self, name: str) -> List[int]:
+        """Non-NULL values of an int column."""
+        return [v for v in self.cols[name] if v != NULL]
+
+    def take(self, indices: Iterable[int]) -> "ResortTable":
+        idx = list(indices)
+        t = ResortTable()
+        for name, col in self.cols.items():
+            picked = [col[i] for i in idx]
+            t.cols[name] = array("h", picked) if name in INT_COLUMNS else picked
+        return t
+
+    def filter(self, mask: Sequence[bool]) -> "ResortTable":
+        """Rows where mask is true; mask may be a list or a NumPy bool array."""
+        return self.take(i for i, keep in enumerate(mask) if keep)
+
+    def head(self, n: int) -> "ResortTable":
+        return self.take(range(min(n, len(self))))
+
+    def valid_mask(self):
+        """NumPy bool array, same rule as main.is_valid_resort."""
+        import numpy as np
+
+        pcts = [self._np(c) for c in ("beginner_pct", "intermediate_pct", "advanced_pct")]
+        present = (pcts[0] != NULL) & (pcts[1] != NULL) & (pcts[2] != NULL)
+        s = pcts[0].astype(np.int32) + pcts[1] + pcts[2]
+        return present & (s >= 95) & (s <= 105)
+
+    def top_k(self, name: str, k: int) -> List[int]:
+        """Row indices of the k largest non-NULL values, largest first; ties keep
+        table order, i.e. the same rows as sorted(..., reverse=True)[:k]."""
+        col = self.cols[name]
+        try:
+            import numpy as np
+        except ImportError:
+            return heapq.nlargest(k, (i for i, v in enumerate(col) if v != NULL), key=col.__getitem__)
+        arr = self._np(name)
+        idx = np.flatnonzero(arr != NULL)
+        if k < len(idx):
+            vals = arr[idx]
+            kth = np.partition(vals, len(vals) - k)[len(vals) - k]
+            above = idx[vals > kth]
+            idx = np.concatenate([above, idx[vals == kth][: k - len(above)]])
+        order = np.lexsort((idx, -arr[idx].astype(np.int32)))
+        return idx[order].tolist()
+
+    def _np(self, name: str):
+        import numpy as np
+
+        col = self.cols[name]
+        # zero-copy view; callers only keep derived arrays, so the buffer export
+        # ends with the call and the array('h') can still grow
+        return np.frombuffer(col, dtype=np.int16) if len(col) else np.empty(0, np.int16)
+
+    def to_pandas(self, copy: bool = True):
+        """DataFrame with nullable Int16 columns and a categorical prefecture.
+
+        copy=False hands the array('h') buffers to pandas without copying;
+        the table cannot grow while that DataFrame is alive.
+        """
+        import numpy as np
+        import pandas as pd
+
+        data: Dict[str, Any] = {}
+        for name in COLUMNS:
+            col = self.cols[name]
+            if name in INT_COLUMNS:
+                arr = np.frombuffer(col, dtype=np.int16) if len(col) else np.empty(0, np.int16)
+                if copy:
+                    arr = arr.copy()
+                data[name] = pd.arrays.IntegerArray(arr, arr == NULL)
+            elif name == "prefecture":
+                data[name] = pd.Categorical(col)
+            else:
+                data[name] = col
+        return pd.DataFrame(data, copy=copy)
+
+
+def _synthetic(rows: int) -> List[Resort]:
+    import random
+
+    rng = random.Random(0)
+    prefs = [f"pref{i:02d}" for i in range(47)]
+    out = []
+    for i in range(rows):
+        b = rng.randint(0, 80)
+        m = rng.randint(0, 100 - b)
+        out.append(Resort(f"resort{i % 5000}", prefs[i % 47], f"https://surfsnow.jp/guide/htm/r{i:06d}s.htm",
+                          i % 47 + 1, b, m, 100 - b - m, "2026-01-01T00:00:00"))
+    return out
+
+
+def bench(rows: int) -> None:
+    source = _synthetic(rows)
+    PlainResort = make_dataclass("PlainResort", [(f.name, f.type) for f in fields(Resort)])
+
+    def traced(build):
+        tracemalloc.start()
+        obj = build()
+        used = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return obj, used
+
+    # strings are shared with `source` in every case, so this is per-record overhead
+    _, plain_bytes = traced(lambda: [PlainResort(r.name, r.prefecture, r.url, r.kencd, r.beginner_pct,
+                                                 r.intermediate_pct, r.advanced_pct, r.fetched_at) for r in source])
+    as_list, list_bytes = traced(lambda: [Resort(r.name, r.prefecture, r.url, r.kencd, r.beginner_pct,
+                                                 r.intermediate_pct, r.advanced_pct, r.fetched_at) for r in source])
+    table, table_bytes = traced(lambda: ResortTable.from_resorts(source))
+    print(f"{rows:,} resorts, bytes per row: dataclass {plain_bytes / rows:.0f}, "
+          f"slotted dataclass {list_bytes / rows:.0f}, ResortTable {table_bytes / rows:.0f} "
+          f"(x{plain_bytes / max(table_bytes, 1):.1f} smaller than dataclass)")
+
+    t = time.perf_counter()
+    ref = sorted([r for r in as_list if r.beginner_pct is not None], key=lambda x: x.beginner_pct, reverse=True)[:10]
+    t_sorted = time.perf_counter() - t
+    table.top_k("beginner_pct", 10)  # keep the one-off numpy import out of the timing
+    t = time.perf_counter()
+    top = table.top_k("beginner_pct", 10)
+    t_topk = time.perf_counter() - t
+    same = [r.url for r in ref] == [table.column("url")[i] for i in top]
+    print(f"  top 10: sorted() {t_sorted * 1000:.1f} ms, top_k {t_topk * 1000:.1f} ms; same rows: {same}")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--rows", type=int, default=200_000)
+    args = p.parse_args()
+    bench(args.rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Sharded crawl: prefectures split across N main.py processes, then one merge.
+
+Every shard crawls its own kencd list with its own session, rate budget,
+journal and CSV under output/shards/shard-NN/ (CRAWL_OUT_DIR). By default
+--rate/--max-rate is one budget for the host, divided between the shards:
+sharding then splits the work (and its CPU: parsing, writes) but never
+sends more requests per second than one crawler would, so more shards do
+not raise throughput against a rate-bound host. --rate-per-shard gives
+every shard the whole --rate instead, i.e. up to N x --rate in total; use
+it only where the host allows that. The merge keeps one row per resort URL
+and rebuilds output/ski_resorts.csv and output/ski.db.
+
+    python shard.py --shards 4 --engine async --concurrency 4
+    python shard.py --shards 4 --rate 2 --rate-per-shard   # 4 x 2 req/s in total
+    python shard.py --shards 4 --only 3 --resume     # re-run a failed shard, then merge
+    python shard.py --shards 4 --merge-only
+
+Options not listed below go to every main.py process.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import resort_db
+from columnar import export_if_available
+from main import (
+    CSV_PATH,
+    DB_PATH,
+    DEFAULT_RATE,
+    OUT_DIR,
+    PARQUET_PATH,
+    RESORT_PATH_RE,
+    ResortTable,
+    make_plots,
+    save_csv,
+)
+from make_db import read_chunks
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_PY = os.path.join(SRC_DIR, "main.py")
+SHARD_DIR = os.path.abspath(os.path.join(OUT_DIR, "shards"))
+
+
+def split_kencds(shards: int) -> List[List[int]]:
+    # round-robin: the resort-heavy prefectures (Tohoku, Nagano, Niigata...) are
+    # neighbours in kencd order, so contiguous ranges would be badly unbalanced
+    return [list(range(i, 48, shards)) for i in range(1, shards + 1)]
+
+
+def kencd_spec(kencds: List[int]) -> str:
+    parts, start = [], None
+    for i, k in enumerate(kencds):
+        if start is None:
+            start = k
+        if i + 1 == len(kencds) or kencds[i + 1] != k + 1:
+            parts.append(str(start) if start == k else f"{start}-{k}")
+            start = None
+    return ",".join(parts)
+
+
+def shard_dir(n: int) -> str:
+    return os.path.join(SHARD_DIR, f"shard-{n:02d}")
+
+
+def run_shards(shards: List[int], kencds: Dict[int, List[int]], total: int,
+               rate: float, max_rate: float, crawler_args: List[str], split_rate: bool = True) -> Dict[int, int]:
+    """Start one main.py per shard and wait for all; {shard: exit code}.
+
+    With split_rate, rate and max_rate are the total for the host and each
+    shard gets 1/total of them; otherwise each shard gets them whole.
+    """
+    share = total if split_rate else 1
+    procs = {}
+    for n in shards:
+        out = shard_dir(n)
+        os.makedirs(out, exist_ok=True)
+        cmd = [sys.executable, MAIN_PY, "--kencd", kencd_spec(kencds[n]),
+               "--rate", str(rate / share), "--max-rate", str(max_rate / share),
+               "--max-pages", "0", "--max-resorts", "0", "--no-report", *crawler_args]
+        log = open(os.path.join(out, "crawl.log"), "w", encoding="utf-8")
+        procs[n] = (subprocess.Popen(cmd, cwd=SRC_DIR, env={**os.environ, "CRAWL_OUT_DIR": out},
+                                     stdout=log, stderr=subprocess.STDOUT), log)
+        print(f"  shard {n:2d}: kencd {kencd_spec(kencds[n])} -> {out}")
+
+    codes = {}
+    for n, (proc, log) in procs.items():
+        codes[n] = proc.wait()
+        log.close()
+        status = "done" if codes[n] == 0 else f"FAILED (exit {codes[n]}), see {shard_dir(n)}/crawl.log"
+        print(f"  shard {n:2d}: {status}")
+    return codes
+
+
+def _resort_id(url: str) -> int:
+    m = RESORT_PATH_RE.match("/" + url.split("/", 3)[-1])
+    return int(m.group(1)) if m else 0
+
+
+def merge(shards: List[int], csv_path: str = CSV_PATH, db_path: str = DB_PATH) -> ResortTable:
+    """One row per resort URL from every shard CSV into csv_path and db_path.
+
+    A resort listed under several prefectures keeps the row from the lowest
+    kencd, which is the one a single sequential crawl would have journaled.
+    """
+    best: Dict[str, dict] = {}
+    rows = 0
+    for n in shards:
+        path = os.path.join(shard_dir(n), "ski_resorts.csv")
+        if not os.path.exists(path):
+            print(f"  ! shard {n} has no {path}; skipped")
+            continue
+        for chunk in read_chunks(path):
+            for row in chunk:
+                rows += 1
+                cur = best.get(row["url"])
+                if cur is None or (row["kencd"] or 99, row["fetched_at"] or "") < (cur["kencd"] or 99, cur["fetched_at"] or ""):
+                    best[row["url"]] = row
+    merged = sorted(best.values(), key=lambda r: (r["kencd"] or 99, _resort_id(r["url"])))
+    print(f"  merged {rows} shard rows -> {len(merged)} resorts ({rows - len(merged)} duplicates dropped)")
+
+    table = ResortTable.from_records(merged)
+    save_csv(table, csv_path)
+    conn = resort_db.connect(db_path)
+    changed = resort_db.upsert(conn, merged)
+    conn.close()
+    print(f"  DB: {changed} rows added/updated -> {db_path}")
+    return table
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--shards", type=int, default=4)
+    p.add_argument("--only", default=None, help='run just these shard numbers, e.g. "2,3"')
+    p.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                   help="requests per second to the host for all shards together, split evenly, so more "
+                        "shards split the work but do not go faster (see --rate-per-shard)")
+    p.add_argument("--max-rate", type=float, default=None,
+                   help="rate ceiling, split the same way (default: --rate, no ramp-up)")
+    p.add_argument("--rate-per-shard", action="store_true",
+                   help="give every shard the whole --rate/--max-rate: N shards send up to N x --rate")
+    p.add_argument("--merge-only", action="store_true", help="merge the existing shard outputs")
+    args, crawler_args = p.parse_known_args(argv)
+
+    total = max(1, min(args.shards, 47))
+    kencds = dict(enumerate(split_kencds(total), start=1))
+    everything = list(kencds)
+    selected = [int(x) for x in args.only.split(",")] if args.only else everything
+
+    started = time.perf_counter()
+    failed = []
+    if not args.merge_only:
+        print(f"[1/2] Crawling {len(selected)} of {total} shards...")
+        max_rate = args.rate if args.max_rate is None else args.max_rate
+        if args.rate_per_shard:
+            print(f"  every shard at {args.rate:g} req/s: up to {args.rate * total:g} req/s to the host in total")
+        else:
+            print(f"  {args.rate:g} req/s shared: {args.rate / total:g} req/s per shard")
+        codes = run_shards(selected, kencds, total, args.rate, max_rate, crawler_args,
+                           split_rate=not args.rate_per_shard)
+        failed = [n for n, c in codes.items() if c != 0]
+    print("[2/2] Merging shard outputs...")
+    table = merge(everything)
+    print(f"  Sharded crawl time: {time.perf_counter() - started:.1f}s")
+    export_if_available(DB_PATH, PARQUET_PATH)
+    make_plots(table)
+    if failed:
+        print(f"\n{len(failed)} shard(s) failed. Re-run them with: "
+              f"python shard.py --shards {total} --only {','.join(map(str, failed))} --resume")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
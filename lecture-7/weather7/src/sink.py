@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import csv
+import os
+import threading
+from dataclasses import asdict
+from typing import Any, Dict, List, Set
+
+import resort_db
+from metrics import METRICS
+
+
+class ResortSink:
+    """Writes each validated Resort as soon as the crawler produces it.
+
+    Rows are appended (and flushed) to the CSV immediately and upserted into
+    ski_resorts in batches of batch_size, each batch in one transaction, so a
+    crash loses at most one unflushed batch of DB rows and nothing in the CSV.
+    The journal may already count those rows as done, so a resumed crawl
+    calls restore() with frontier.results() to upsert them again. The other
+    way round, a crash between the CSV write and the journal's mark_done
+    leaves a row the resumed crawl fetches and writes again: with append=True
+    the CSV is reread, duplicate and torn rows are dropped, and a URL already
+    in the file is never appended twice.
+    """
+
+    def __init__(self, csv_path: str, db_path: str, batch_size: int = 50, append: bool = False):
+        for path in (csv_path, db_path):
+            d = os.path.dirname(path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+        self.csv_path = csv_path
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.seen: Set[str] = set()
+        write_header = not (append and os.path.exists(csv_path) and os.path.getsize(csv_path) > 0)
+        if not write_header:
+            self._dedupe_csv()
+        self.f = open(csv_path, "a" if append else "w", newline="", encoding="utf-8")
+        self.w = csv.DictWriter(self.f, fieldnames=resort_db.COLUMNS)
+        if write_header:
+            self.w.writeheader()
+            self.f.flush()
+        self.conn = resort_db.connect(db_path)
+        self.batch: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+        self.rows = 0
+
+    def _dedupe_csv(self) -> None:
+        with open(self.csv_path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        kept = []
+        for row in rows:
+            if None in row or None in row.values() or row["url"] in self.seen:
+                continue  # torn by a kill mid-write, or written again after a crash
+            self.seen.add(row["url"])
+            kept.append(row)
+        if len(kept) == len(rows):
+            return
+        tmp = self.csv_path + ".tmp"
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=resort_db.COLUMNS)
+            w.writeheader()
+            w.writerows(kept)
+        os.replace(tmp, self.csv_path)
+        print(f"  Dropped {len(rows) - len(kept)} duplicate or partial rows from {self.csv_path}")
+
+    def write(self, resort) -> None:
+        row = asdict(resort)
+        with self.lock, METRICS.time("crawl_stage_seconds", stage="write"):
+            if row["url"] not in self.seen:
+                self.seen.add(row["url"])
+                self.w.writerow(row)
+                self.f.flush()
+            self.batch.append(row)
+            self.rows += 1
+            if len(self.batch) >= self.batch_size:
+                self._flush_db()
+
+    def restore(self, rows: List[Dict[str, Any]]) -> int:
+        """Upsert rows the journal holds (possibly lost with an unflushed batch); returns rows changed."""
+        with self.lock:
+            return resort_db.upsert(self.conn, rows) if rows else 0
+
+    def _flush_db(self) -> None:
+        if self.batch:
+            resort_db.upsert(self.conn, self.batch)
+            self.batch = []
+
+    def close(self) -> None:
+        with self.lock:
+            self._flush_db()
+            self.f.close()
+            self.conn.close()
+        print(f"[3/3] Streamed {self.rows} resorts -> {self.csv_path}, {self.db_path}")
+
+    def __enter__(self) -> "ResortSink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
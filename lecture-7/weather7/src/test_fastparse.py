@@ -0,0 +1,55 @@
+"""Fast scanner vs BeautifulSoup parity on fixtures/.
+
+    python -m pytest test_fastparse.py
+    python -m unittest test_fastparse
+"""
+from __future__ import annotations
+
+import unittest
+
+from bench_parse import FIXTURES_DIR, load_fixtures, record
+from fastparse import charref
+from main import (
+    extract_resort_links_from_list,
+    extract_resort_links_from_list_bs4,
+    parse_resort_page,
+    parse_resort_page_bs4,
+)
+
+URL = "https://surfsnow.jp/guide/htm/r0000s.htm"
+
+
+class FastParseParityTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.pages = load_fixtures(FIXTURES_DIR)
+        self.assertTrue(self.pages, f"no fixtures in {FIXTURES_DIR}")
+
+    def test_resorts_match_bs4(self) -> None:
+        for path, html in self.pages:
+            with self.subTest(fixture=path):
+                self.assertEqual(record(parse_resort_page(URL, html, 1)),
+                                 record(parse_resort_page_bs4(URL, html, 1)))
+
+    def test_links_match_bs4(self) -> None:
+        for path, html in self.pages:
+            with self.subTest(fixture=path):
+                self.assertEqual(extract_resort_links_from_list(html),
+                                 extract_resort_links_from_list_bs4(html))
+
+    def test_entity_edge_cases_match_bs4(self) -> None:
+        refs = ["&amp;", "&AMP", "&nbsp;", "&lang;", "&notanentity;", "&amp", "&#150;", "&#x7C;",
+                "&#0;", "&#xD800;", "&#1114112;", "&#12abc;", "&#xZZ;", "&#128512;"]
+        for ref in refs:
+            html = f"<html><head><title>A {ref} B【 北海道 】</title></head><body><h1>x{ref}y</h1></body></html>"
+            with self.subTest(ref=ref):
+                self.assertEqual(record(parse_resort_page(URL, html, 1)),
+                                 record(parse_resort_page_bs4(URL, html, 1)))
+
+    def test_charref_windows_1252(self) -> None:
+        self.assertEqual(charref("150"), "–")
+        self.assertEqual(charref("x96"), "–")
+        self.assertEqual(charref("0"), "�")
+
+
+if __name__ == "__main__":
+    unittest.main()